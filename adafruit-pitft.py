@@ -11,19 +11,28 @@ Written in Python by Melissa LeBlanc-Williams for Adafruit Industries
 
 import time
 import os
+import re
+import math
 import glob
+import hashlib
+import filecmp
+import json
+import shlex
+import shutil
+import concurrent.futures
 
 try:
     import click
 except ImportError:
     raise RuntimeError("The library 'Click' was not found. To install, try typing: pip3 install Click")
-try:
-    from adafruit_shell import Shell
-except ImportError:
-    raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: pip3 install adafruit-python-shell")
+import drm_inventory
+import pitft_splash
+import wayland_config
+from target_root import TargetShell
 
-shell = Shell()
+shell = TargetShell()
 shell.group = 'PITFT'
+shell.parse_target_args()
 
 __version__ = "4.0.0"
 
@@ -37,7 +46,8 @@ type: Unique identifier for the display type.
 menulabel: The label to display in the menu.
 product: The product name for the display.
 kernel_upgrade: Whether the kernel needs to be upgraded for this display.
-overlay: The overlay string to apply for the display.
+overlay: The overlay string to apply for the display. {pitftrot}, {speed} and {fps} are
+    filled in at install time, the latter two from the SPI bandwidth planner.
 display_type: The display type identifier for con2fbmap.
 width: Width of the display in pixels.
 height: Height of the display in pixels.
@@ -50,13 +60,13 @@ touchscreen: Dictionary containing touchscreen settings for displays with touchs
     overlay_params: Overlay parameters for different rotations.
     calibrations: Calibration data for the touchscreen. Can be overall or per rotation.
 overlay_drm_option: Optional parameter to add for DRM support.
+spi_max_speed: Highest SPI clock for this display if lower than its controller's limit.
 overlay_src: Source path for the overlay file (if applicable).
 overlay_dest: Destination path for the compiled overlay file (if applicable).
 mipi_data (Optional): Dictionary containing MIPI display data.
     command_bin: Name of the command binary for MIPI.
     gpio: GPIO settings for the display.
     viewport: Viewport settings for different rotations.
-mirror_rotations: Dictionary mapping pitftrot values to DRM rotation values.
 """
 
 # Touchscreen Products
@@ -82,7 +92,8 @@ config = [
                 "270": "0 -1 1 1 0 0",
             },
         },
-        "overlay": "dtoverlay=pitft24rv2,rotate={pitftrot},fps=60",
+        "overlay": "dtoverlay=pitft24rv2,rotate={pitftrot},speed={speed},fps={fps}",
+        "spi_max_speed": 32000000,
         "display_type": "ili9341",
         "width": 320,
         "height": 240,
@@ -115,7 +126,7 @@ config = [
                 "270": "touch-swapxy,touch-invy",
             },
         },
-        "overlay": "dtoverlay=pitft28-resistive,rotate={pitftrot},speed=64000000,fps=30",
+        "overlay": "dtoverlay=pitft28-resistive,rotate={pitftrot},speed={speed},fps={fps}",
 	    "overlay_drm_option": "drm",
         "display_type": "ili9341",
         "width": 320,
@@ -126,7 +137,7 @@ config = [
         "menulabel": "PiTFT 2.2\" no touch",
         "product": "2.2\" no touch",
         "kernel_upgrade": False,
-        "overlay": "dtoverlay=pitft22,rotate={pitftrot},speed=64000000,fps=30",
+        "overlay": "dtoverlay=pitft22,rotate={pitftrot},speed={speed},fps={fps}",
 	    "overlay_drm_option": "drm",
         "display_type": "ili9341",
         "width": 320,
@@ -155,7 +166,7 @@ config = [
             },
             "calibrations": "320 65536 0 -65536 0 15728640 65536",
         },
-        "overlay": "dtoverlay=pitft28-capacitive,rotate={pitftrot},speed=64000000,fps=30",
+        "overlay": "dtoverlay=pitft28-capacitive,rotate={pitftrot},speed={speed},fps={fps}",
 	    "overlay_drm_option": "drm",
         "display_type": "ili9341",
         "width": 320,
@@ -183,7 +194,7 @@ config = [
                 "270": "touch-swapxy,touch-invy",
             },
         },
-        "overlay": "dtoverlay=pitft35-resistive,rotate={pitftrot},speed=20000000,fps=20",
+        "overlay": "dtoverlay=pitft35-resistive,rotate={pitftrot},speed={speed},fps={fps}",
 	    "overlay_drm_option": "drm",
         "display_type": "hx8357d",
         "width": 480,
@@ -198,7 +209,7 @@ config = [
         "kernel_module": "fb_st7789v",
         "overlay_src": "overlays/minipitft13-overlay.dts",
         "overlay_dest": "{boot_dir}/overlays/drm-minipitft13.dtbo",
-        "overlay": "dtoverlay=drm-minipitft13,rotate={pitftrot},fps=60",
+        "overlay": "dtoverlay=drm-minipitft13,rotate={pitftrot},speed={speed},fps={fps}",
         "mipi_data": {
             "command_bin": "adafruit_st7789_drm",
             "gpio": "dc-gpio=25,backlight-gpio=22",
@@ -212,12 +223,6 @@ config = [
         "display_type": "panel-mipi-dbi-spi",
         "width": 240,
         "height": 240,
-        "mirror_rotations": {
-            "0": "0",
-            "90": "1",
-            "180": "2",
-            "270": "3",
-        },
     },
     {
         "type": "st7789_240x320",
@@ -227,7 +232,7 @@ config = [
         "kernel_module": "fb_st7789v",
         "overlay_src": "overlays/st7789v_240x320-overlay.dts",
         "overlay_dest": "{boot_dir}/overlays/drm-st7789v_240x320.dtbo",
-        "overlay": "dtoverlay=drm-st7789v_240x320,rotate={pitftrot},fps=30",
+        "overlay": "dtoverlay=drm-st7789v_240x320,rotate={pitftrot},speed={speed},fps={fps}",
         "mipi_data": {
             "command_bin": "adafruit_st7789_drm",
             "gpio": "dc-gpio=25,backlight-gpio=22",
@@ -250,7 +255,7 @@ config = [
         "kernel_module": "fb_st7789v",
         "overlay_src": "overlays/minipitft114-overlay.dts",
         "overlay_dest": "{boot_dir}/overlays/drm-minipitft114.dtbo",
-        "overlay": "dtoverlay=drm-minipitft114,rotate={pitftrot},fps=60",
+        "overlay": "dtoverlay=drm-minipitft114,rotate={pitftrot},speed={speed},fps={fps}",
         "mipi_data": {
             "command_bin": "adafruit_st7789_drm",
             "gpio": "dc-gpio=25,backlight-gpio=22",
@@ -270,12 +275,6 @@ config = [
         "display_type": "panel-mipi-dbi-spi",
         "width": 240,
         "height": 135,
-        "mirror_rotations": {
-            "0": "3",
-            "90": "2",
-            "180": "1",
-            "270": "0",
-        },
     },
     {
         "type": "st7789v_bonnet_240x240",
@@ -285,7 +284,7 @@ config = [
         "kernel_module": "fb_st7789v",
         "overlay_src": "overlays/tftbonnet13-overlay.dts",
         "overlay_dest": "{boot_dir}/overlays/drm-tftbonnet13.dtbo",
-        "overlay": "dtoverlay=drm-tftbonnet13,rotate={pitftrot},fps=60",
+        "overlay": "dtoverlay=drm-tftbonnet13,rotate={pitftrot},speed={speed},fps={fps}",
         "mipi_data": {
             "command_bin": "adafruit_st7789_drm",
             "gpio": "dc-gpio=25,backlight-gpio=26",
@@ -299,29 +298,75 @@ config = [
         "display_type": "panel-mipi-dbi-spi",
         "width": 240,
         "height": 240,
-        "mirror_rotations": {
-            "0": "0",
-            "90": "1",
-            "180": "2",
-            "270": "3",
-        },
     },
 ]
 
-# default rotations
-mirror_rotations = {
-    "0": "1",
-    "90": "0",
-    "180": "3",
-    "270": "2",
-}
-
 # default mipi data
 mipi_data = {
     "speed": 40000000,
     "spi": "spi0-0",
 }
 
+# Packages needed by every install. Tuples are alternatives in order of preference.
+REQUIRED_PACKAGES = [
+    ("libts0", "tslib", "libts-dev"),
+    "bc", "fbi", "git", "python3-dev", "python3-pip", "python3-smbus", "python3-spidev",
+    "evtest", "libts-bin", "device-tree-compiler", "build-essential", "python3-evdev",
+]
+# Packages needed by the helpers each install type sets up
+INSTALL_TYPE_PACKAGES = {
+    "console": ["python3-click"],
+    "mirror": ["python3-numpy", "python3-click"],
+}
+# Kernel releases since Bookworm are named like 6.6.51+rpt-rpi-v8, the flavour being rpi-v8
+KERNEL_FLAVOUR_PATTERN = re.compile(r"\+rpt-(rpi-[\w-]+)$")
+
+# panel-mipi-dbi firmware format: 15 byte magic, 1 byte version, then a list of
+# commands encoded as command byte, parameter count and parameters. Command 0x00
+# is a delay with a single parameter in milliseconds.
+MIPI_DBI_MAGIC = b"MIPI DBI" + bytes(7)
+MIPI_DBI_VERSION = 1
+MIPI_DBI_DELAY = 0x00
+HELPER_BLOCK_START = "# --- added by adafruit-pitft-helper"
+HELPER_BLOCK_END = "# --- end adafruit-pitft-helper"
+CONFIG_SECTION_PATTERN = re.compile(r"^\s*\[([^\]]*)\]")
+
+MIPI_ROTATION_PATTERN = re.compile(r"^#*\s*(.*?)#\s*rotation\s+(\d+)")
+
+# Highest SPI clock each display controller handles reliably
+SPI_MAX_SPEED = {
+    "ili9341": 64000000,
+    "hx8357d": 20000000,
+    "panel-mipi-dbi-spi": 40000000,
+}
+# The SPI clock is the core clock divided by an even divisor
+SPI_CORE_CLOCKS = (
+    ("Raspberry Pi 5", 200000000),
+    ("Compute Module 5", 200000000),
+    ("Raspberry Pi 4", 500000000),
+    ("Compute Module 4", 500000000),
+)
+SPI_DEFAULT_CORE_CLOCK = 250000000
+SPI_REPORT_MODELS = (
+    ("Pi Zero-3", SPI_DEFAULT_CORE_CLOCK),
+    ("Pi 4", 500000000),
+    ("Pi 5", 200000000),
+)
+SPI_MAX_TRANSFER = 65535        # Bytes per DMA transfer
+SPI_TRANSFER_OVERHEAD = 20e-6   # Seconds of setup per DMA transfer
+SPI_FRAME_OVERHEAD = 100e-6     # Seconds per frame for the address window commands
+SPI_HEADROOM = 0.9              # Fraction of the bus a steady frame rate may use
+SPI_MAX_FPS = 60
+# Terminus sizes by the panel's short side in pixels, giving about 40 columns
+CONSOLE_FONT_SIZES = ((240, "6x12"), (320, "8x14"))
+CONSOLE_FONT_DIR = "/usr/share/consolefonts"
+# Where con2fbmap-helper.sh loads the console font from at boot
+CONSOLE_FONT_CACHE = "/etc/console-setup/pitft-console.psf.gz"
+SETUPCON_SAVE = "setupcon --force --save-only"
+INITRAMFS_HOOK = "/etc/initramfs-tools/hooks/adafruit-pitft"
+INITRAMFS_KERNEL_HOOK = "/etc/kernel/postinst.d/zz-adafruit-pitft"
+LIVE_PROBE_TIMEOUT = 10         # Seconds to wait for the panel to probe after loading the overlay
+
 install_types = {
     "mirror": "Setup PiTFT as desktop display (mirror)",
     "console": "Display console on PiTFT (console)",
@@ -329,6 +374,25 @@ install_types = {
 }
 
 PITFT_ROTATIONS = ("90", "180", "270", "0")
+CACHE_DIR = "/var/cache/adafruit-pitft"
+APT_LISTS_DIR = "/var/lib/apt/lists"
+APT_SOURCES = ("/etc/apt/sources.list", "/etc/apt/sources.list.d")
+APT_UPDATE_STAMP = f"{CACHE_DIR}/apt-update-stamp"
+APT_MAX_AGE = 6 * 60 * 60 # Seconds before apt indexes are considered stale
+# Fingerprint of each applied step: a hash of its inputs and of the files it produced
+STATE_FILE = "/var/lib/adafruit-pitft/state.json"
+# What the installs changed, so uninstall can revert exactly that
+MANIFEST_FILE = "/var/lib/adafruit-pitft/manifest.json"
+BACKUP_DIR = "/var/lib/adafruit-pitft/backup"
+# Copy of the --splash image, so later runs can lay it out for a new rotation
+SPLASH_SOURCE = "/var/lib/adafruit-pitft/splash-source"
+# raspi-config boot behaviour for each (get_boot_cli, get_autologin) answer
+BOOT_BEHAVIOURS = {("0", "0"): "B2", ("0", "1"): "B1", ("1", "0"): "B4", ("1", "1"): "B3"}
+# Where uninstall looks for the unit files of recorded services
+SYSTEMD_UNIT_DIRS = ("/etc/systemd/system", "/lib/systemd/system", "/usr/lib/systemd/system")
+OVERSCAN_PATTERN = "^#?\\s*disable_overscan=.*$"
+# Sources whose changes invalidate every applied step
+INSTALLER_SOURCES = ("adafruit-pitft.py", "drm_inventory.py", "pitft_mirror.py", "pitft_splash.py", "wayland_config.py", "templates/*", "overlays/*.dts", "mipi/*.txt")
 UPDATE_DB = False
 SYSTEMD = None
 REMOVE_KERNEL_PINNING = False
@@ -337,6 +401,301 @@ pitftrot = None
 auto_reboot = None
 is_desktop = False
 manager = None
+bootconfig = None
+applied_state = None
+installer_digest = None
+changed_steps = []
+added_packages = []
+enabled_services = []
+previous_boot_behaviour = None
+# The config.txt lines settings replaced, or None where a setting was added
+previous_config_lines = {}
+live_mode = False
+initramfs_mode = False
+splash_image = None
+drop_splash = False
+
+class BootConfig:
+    """Parsed config.txt that collects edits in memory and writes them back once
+
+    Filter sections such as [all] or [pi4] are tracked so that appended settings
+    always land in an [all] section, and the adafruit-pitft-helper block can be
+    removed or replaced as a unit.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.original = shell.read_text_file(path) if shell.exists(path) else ""
+        self.lines = self.original.splitlines()
+        self.edits = 0
+        self.backup = False
+
+    def section(self, index=None):
+        """Return the filter that applies at a line index, or at the end of the file"""
+        if index is None:
+            index = len(self.lines)
+        for line in reversed(self.lines[:index]):
+            match = CONFIG_SECTION_PATTERN.match(line)
+            if match:
+                return match.group(1).strip()
+        return "all"
+
+    def search(self, pattern):
+        regex = re.compile(pattern)
+        return any(regex.search(line) for line in self.lines)
+
+    def replace(self, pattern, replacement=""):
+        """Substitute the pattern on each matching line, returning True if anything matched"""
+        regex = re.compile(pattern)
+        lines = []
+        matched = False
+        for line in self.lines:
+            if regex.search(line):
+                matched = True
+                lines.extend(regex.sub(replacement, line).split("\n"))
+            else:
+                lines.append(line)
+        if matched:
+            self.lines = lines
+            self.edits += 1
+        return matched
+
+    def reconfig(self, pattern, replacement):
+        """Replace matching lines, or append the replacement if nothing matches"""
+        if not self.replace(pattern, replacement):
+            self.append(replacement)
+
+    def append(self, text):
+        """Append lines to the end of the file inside an [all] section"""
+        if self.section() != "all":
+            self.lines.append("[all]")
+        self.lines.extend(text.split("\n"))
+        self.edits += 1
+
+    def add_block(self, text):
+        """Append a block such as the adafruit-pitft-helper section after a blank line"""
+        self.lines.append("")
+        self.lines.extend(text.rstrip("\n").split("\n"))
+        self.edits += 1
+
+    def remove_block(self):
+        """Remove any adafruit-pitft-helper sections, returning True if one was found"""
+        removed = False
+        while True:
+            start = next((i for i, line in enumerate(self.lines) if line.startswith(HELPER_BLOCK_START)), None)
+            if start is None:
+                break
+            end = next((i for i in range(start, len(self.lines)) if self.lines[i].startswith(HELPER_BLOCK_END)), None)
+            if end is None:
+                break
+            # Also drop the blank line that was added in front of the block
+            if start > 0 and not self.lines[start - 1].strip():
+                start -= 1
+            del self.lines[start:end + 1]
+            removed = True
+        if removed:
+            self.edits += 1
+        return removed
+
+    def commit(self):
+        """Write all edits with a single fsync'd atomic replace"""
+        content = "\n".join(self.lines) + "\n" if self.lines else ""
+        if not self.edits or content == self.original:
+            print(f"{self.path} is already up to date")
+            return
+        if self.backup:
+            write_binary_file(f"{os.path.dirname(self.path)}/configtxt.bak", self.original.encode())
+        write_binary_file(self.path, content.encode())
+        if not shell.planning:
+            print(f"Applied {self.edits} edits to {self.path} in one write, saving {self.edits - 1} rewrites")
+        self.original = content
+        self.edits = 0
+        self.backup = False
+
+def get_bootconfig():
+    """Return the in-memory config.txt, loading it on first use"""
+    global bootconfig
+    if bootconfig is None:
+        bootconfig = BootConfig(f"{boot_dir}/config.txt")
+    return bootconfig
+
+def set_overscan(enabled):
+    """Set overscan compensation in the in-memory config.txt like raspi-config's do_overscan
+
+    raspi-config would edit config.txt on disk, where the next commit overwrites it.
+    """
+    bootconfig = get_bootconfig()
+    if "disable_overscan" not in previous_config_lines:
+        lines = [line for line in bootconfig.lines if re.search(OVERSCAN_PATTERN, line)]
+        previous_config_lines["disable_overscan"] = lines[0] if lines else None
+    if not enabled:
+        bootconfig.replace("^overscan_", "#overscan_")
+    bootconfig.reconfig(OVERSCAN_PATTERN, f"disable_overscan={0 if enabled else 1}")
+
+def commit_bootconfig():
+    if bootconfig is not None:
+        bootconfig.commit()
+
+def path_fingerprint(path):
+    """Return the hash of a file on the target, "dir" for a directory or None if it is missing"""
+    host_path = shell.path(path)
+    if os.path.isdir(host_path):
+        return "dir"
+    if not os.path.exists(host_path):
+        return None
+    return file_hash(host_path)
+
+def installer_hash():
+    """Return a hash of this script and the templates, overlays and firmware sources it installs"""
+    global installer_digest
+    if installer_digest is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        sha = hashlib.sha256()
+        for path in sorted(path for pattern in INSTALLER_SOURCES for path in glob.glob(os.path.join(script_dir, pattern))):
+            sha.update(f"{os.path.relpath(path, script_dir)} {file_hash(path)}\n".encode())
+        installer_digest = sha.hexdigest()
+    return installer_digest
+
+def get_applied_state():
+    """Return the recorded steps, loading them from the target on first use"""
+    global applied_state
+    if applied_state is None:
+        try:
+            applied_state = json.loads(shell.read_text_file(STATE_FILE))
+        except (FileNotFoundError, ValueError):
+            applied_state = {}
+    return applied_state
+
+def run_step(name, inputs, function, *args):
+    """Run an install step unless it was applied with the same inputs and its files are untouched
+
+    The files a step writes, edits or removes are recorded and hashed when the
+    install finishes, so a skipped step has been verified against the target.
+    """
+    key = hashlib.sha256(json.dumps([installer_hash(), inputs], sort_keys=True).encode()).hexdigest()
+    recorded = get_applied_state().get(name)
+    if recorded and recorded["inputs"] == key and all(path_fingerprint(path) == digest for path, digest in recorded["files"].items()):
+        print(f"{name} already applied and unchanged, skipping")
+        return True
+    written = len(shell.written)
+    edits = get_bootconfig().edits
+    if not function(*args):
+        return False
+    files = {shell.target_path(path) for path in shell.written[written:]}
+    if get_bootconfig().edits != edits:
+        files.add(get_bootconfig().path)
+    get_applied_state()[name] = {"inputs": key, "files": dict.fromkeys(sorted(files))}
+    changed_steps.append(name)
+    return True
+
+def save_applied_state():
+    """Record the hashes of every applied step's files as they are now"""
+    state = get_applied_state()
+    for step in state.values():
+        step["files"] = {path: path_fingerprint(path) for path in step["files"]}
+    os.makedirs(os.path.dirname(shell.path(STATE_FILE)), exist_ok=True)
+    write_binary_file(STATE_FILE, json.dumps(state, indent=1, sort_keys=True).encode())
+
+def get_manifest():
+    """Return the recorded install manifest, or None if nothing was installed with one"""
+    try:
+        return json.loads(shell.read_text_file(MANIFEST_FILE))
+    except (FileNotFoundError, ValueError):
+        return None
+
+def added_lines(path, backup):
+    """Return the lines of a text file on the target that are not in its backup"""
+    try:
+        original = set(shell.read_text_file(backup).splitlines())
+        return [line for line in shell.read_text_file(path).splitlines() if line not in original]
+    except (FileNotFoundError, UnicodeDecodeError):
+        return []
+
+def remove_added_lines(text, added):
+    """Return text without the lines an install added and without any helper block"""
+    lines = []
+    in_block = False
+    for line in text.splitlines():
+        if line.startswith(HELPER_BLOCK_START):
+            in_block = True
+        elif not in_block and line not in added:
+            lines.append(line)
+        elif line.startswith(HELPER_BLOCK_END):
+            in_block = False
+    return "".join(f"{line}\n" for line in lines)
+
+def save_manifest(install_type):
+    """Add the files, packages, services and settings this install changed to the manifest
+
+    The first install to touch a file keeps a copy of its original content, so
+    the manifest always leads back to the system as it was before any install.
+    """
+    manifest = get_manifest() or {"files": {}, "packages": [], "services": [], "raspi_config": {}, "config_txt": {}}
+    state_dir = os.path.dirname(STATE_FILE)
+    for host_path, original in list(shell.originals.items()):
+        path = shell.target_path(host_path)
+        if path in manifest["files"] or path.startswith(state_dir + os.sep):
+            continue
+        backup = None
+        if original is not None:
+            backup = BACKUP_DIR + path
+            os.makedirs(os.path.dirname(shell.path(backup)), exist_ok=True)
+            write_binary_file(backup, original)
+        manifest["files"][path] = {"backup": backup}
+    for path, entry in manifest["files"].items():
+        entry["sha256"] = path_fingerprint(path)
+        if entry["backup"] is not None:
+            entry["added"] = added_lines(path, entry["backup"])
+    manifest["packages"] = sorted(set(manifest["packages"]) | set(added_packages))
+    manifest["services"] = sorted(set(manifest["services"]) | set(enabled_services))
+    if previous_boot_behaviour is not None:
+        manifest["raspi_config"].setdefault("do_boot_behaviour", previous_boot_behaviour)
+    for setting, line in previous_config_lines.items():
+        manifest.setdefault("config_txt", {}).setdefault(setting, line)
+    manifest["install_type"] = install_type
+    write_binary_file(MANIFEST_FILE, json.dumps(manifest, indent=1, sort_keys=True).encode())
+
+def revert_manifest(manifest):
+    """Undo what the manifest records and nothing else
+
+    Files are put back from their backups, or only the lines the installs added
+    are taken out if they were edited since, and config.txt settings that were
+    replaced get their original lines back. Packages are only removed, in a
+    single apt transaction, when an install added them.
+    """
+    for service in manifest["services"]:
+        # A unit that is gone can't be disabled, and would stop the rest of the uninstall
+        if not any(shell.exists(f"{unit_dir}/{service}") for unit_dir in SYSTEMD_UNIT_DIRS):
+            print(f"{service} is no longer installed, skipping")
+            continue
+        print(f"Disabling {service}...")
+        if not shell.run_command(f"systemctl disable {service}"):
+            shell.warn(f"Unable to disable {service}")
+    for path, entry in sorted(manifest["files"].items()):
+        if entry["backup"] is None:
+            shell.remove(path)
+        elif path_fingerprint(path) == entry["sha256"]:
+            with open(shell.path(entry["backup"]), "rb") as file:
+                write_binary_file(path, file.read())
+        elif shell.exists(path) and entry.get("added"):
+            print(f"{path} was changed since it was installed, removing only the lines that were added")
+            write_binary_file(path, remove_added_lines(shell.read_text_file(path), entry["added"]).encode())
+        else:
+            shell.warn(f"{path} was changed since it was installed, leaving it as it is")
+    for setting, line in sorted(manifest.get("config_txt", {}).items()):
+        # Settings that were added are taken out with the rest of the added lines
+        if line is not None:
+            get_bootconfig().reconfig(f"^#?\\s*{setting}=.*$", line)
+    if manifest["services"]:
+        shell.run_command("systemctl daemon-reload")
+    if INITRAMFS_HOOK in manifest["files"]:
+        rebuild_initramfs(create=False)
+    for setting, value in sorted(manifest["raspi_config"].items()):
+        shell.run_raspi_config(f"{setting} {value}")
+    if manifest["packages"]:
+        print("Removing {}...".format(" ".join(manifest["packages"])))
+        shell.run_command("apt-get remove -y {}".format(" ".join(manifest["packages"])))
+    shell.remove(os.path.dirname(STATE_FILE))
 
 def warn_exit(message):
     shell.warn(message)
@@ -347,62 +706,188 @@ def uninstall_cb(ctx, _param, value):
        return
     uninstall()
 
+def precompile_overlays_cb(ctx, _param, value):
+    if not value or ctx.resilient_parsing:
+       return
+    if not precompile_overlays():
+        shell.exit(1)
+    shell.exit()
+
+def spi_report_cb(ctx, _param, value):
+    if not value or ctx.resilient_parsing:
+       return
+    print_spi_report()
+    shell.exit()
+
 def print_version_cb(ctx, _param, value):
     if not value or ctx.resilient_parsing:
        return
     print("Adafruit PiTFT Helper v{}".format(__version__))
     shell.exit(1)
 
-def progress(ellipsis_count):
-    for i in range(ellipsis_count):
-        print("...", end='')
-        time.sleep(1)
-    print("")
+def newest_mtime(paths):
+    """Return the newest modification time of the given files or directory contents"""
+    newest = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for entry in os.scandir(path):
+                if entry.is_file():
+                    newest = max(newest, entry.stat().st_mtime)
+        elif os.path.exists(path):
+            newest = max(newest, os.path.getmtime(path))
+    return newest
+
+def last_apt_update_duration():
+    """Return how long the last recorded apt-get update took in seconds"""
+    try:
+        return float(shell.read_text_file(APT_UPDATE_STAMP).strip())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def apt_indexes_fresh():
+    """Check if the apt indexes are newer than the sources and younger than APT_MAX_AGE"""
+    # Release files are only replaced when the archive changes, so also consider
+    # the stamps written after a successful update
+    lists_mtime = newest_mtime(
+        glob.glob(f"{APT_LISTS_DIR}/*Release") +
+        [APT_UPDATE_STAMP, "/var/lib/apt/periodic/update-success-stamp"]
+    )
+    if not lists_mtime:
+        return False
+    if newest_mtime(APT_SOURCES) > lists_mtime:
+        return False
+    return time.time() - lists_mtime < APT_MAX_AGE
 
 def sysupdate():
     global UPDATE_DB
-    if not UPDATE_DB:
-        print("Updating apt indexes...", end='')
-        progress(3)
-        if not shell.run_command('sudo apt-get update', suppress_message=True):
-            warn_exit("Apt failed to update indexes! Try running 'sudo apt-get update' manually.")
-        if not shell.run_command('sudo apt-get update', suppress_message=True):
-            warn_exit("Apt failed to update indexes! Try running 'sudo apt-get update' manually.")
-        print("Reading package lists...")
-        progress(3)
+    if UPDATE_DB:
+        return True
+    if shell.root is not None:
+        # The image's indexes are refreshed on its first boot
+        UPDATE_DB = shell.run_command('sudo apt-get update')
+        return UPDATE_DB
+    if apt_indexes_fresh():
+        print("Apt indexes are up to date, skipping update.")
+        # The old behavior was two updates plus 6 seconds of progress dots
+        print("Saved about {:.0f} seconds.".format(last_apt_update_duration() * 2 + 6))
         UPDATE_DB = True
+        return True
+    print("Updating apt indexes...")
+    start_time = time.monotonic()
+    if not shell.run_command('sudo apt-get update', suppress_message=True):
+        warn_exit("Apt failed to update indexes! Try running 'sudo apt-get update' manually.")
+    UPDATE_DB = True
+    if shell.planning:
+        return True
+    duration = time.monotonic() - start_time
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    shell.write_text_file(APT_UPDATE_STAMP, f"{duration:.1f}", append=False)
+    print("Apt indexes updated in {:.0f} seconds, saved about {:.0f} seconds.".format(duration, duration + 6))
     return True
 
 ############################ Sub-Scripts ############################
 
-def softwareinstall():
+def query_installed_packages(packages):
+    """Return the subset of packages that dpkg reports as installed on the target"""
+    output = shell.run_host_command("dpkg-query --admindir={} -W -f='${{Package}} ${{db:Status-Abbrev}}\\n' {} 2>/dev/null".format(shell.path("/var/lib/dpkg"), " ".join(packages)), suppress_message=True, return_output=True)
+    installed = set()
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and fields[1].startswith("ii"):
+            installed.add(fields[0].split(":")[0])
+    return installed
+
+def query_available_packages(packages):
+    """Return the subset of packages that apt has an installation candidate for"""
+    if not packages:
+        return set()
+    if shell.root is not None:
+        # The image's indexes are only fetched on first boot, so take the first alternative
+        return set(packages)
+    output = shell.run_command("apt-cache policy {} 2>/dev/null".format(" ".join(packages)), suppress_message=True, return_output=True)
+    available = set()
+    package = None
+    for line in output.splitlines():
+        if line and not line[0].isspace() and line.endswith(":"):
+            package = line[:-1].split(":")[0]
+        elif package and line.strip().startswith("Candidate:") and "(none)" not in line:
+            available.add(package)
+    return available
+
+def package_alternatives(package):
+    """Return the alternatives of a requirement, which is a package name or a tuple of names"""
+    return (package,) if isinstance(package, str) else package
+
+def plan_packages(packages):
+    """Resolve alternatives against the package cache and drop packages that are already installed"""
+    names = set()
+    for package in packages:
+        names.update(package_alternatives(package))
+    installed = query_installed_packages(sorted(names))
+    missing = [package for package in packages if not installed.intersection(package_alternatives(package))]
+    if not missing:
+        return []
+    # The indexes are only refreshed when something actually has to be installed,
+    # and before the candidates are looked up since a fresh system has no lists yet
+    if not sysupdate():
+        warn_exit("Unable to apt-get update")
+    available = query_available_packages(sorted(names - installed))
+    plan = []
+    for package in missing:
+        alternatives = package_alternatives(package)
+        choice = next((alternative for alternative in alternatives if alternative in available), None)
+        if choice is None:
+            warn_exit("Apt has no installation candidate for {}!".format(" or ".join(alternatives)))
+        if choice not in plan:
+            plan.append(choice)
+    return plan
+
+def apt_install(packages):
+    """Install the packages that are still missing in a single apt transaction"""
+    plan = plan_packages(packages)
+    if not plan:
+        print("All required packages are already installed.")
+        return True
+    print("Installing {}...".format(" ".join(plan)))
+    changed_steps.append("packages")
+    added_packages.extend(plan)
+    return shell.run_command("apt-get install -y {}".format(" ".join(plan)))
+
+def required_packages(install_type):
+    """Return every package the display, the install type and the options need"""
+    packages = REQUIRED_PACKAGES + INSTALL_TYPE_PACKAGES.get(install_type, [])
+    if initramfs_mode and use_mipi_driver():
+        packages.append("initramfs-tools")
+    # The splash is converted by this machine, so an image never needs Pillow
+    if install_type == "console" and shell.root is None and splash_source():
+        packages.append("python3-pil")
+    return packages + kernel_header_packages()
+
+def softwareinstall(install_type):
     print("Installing Pre-requisite Software...This may take a few minutes!")
-    if not shell.run_command("apt-get install -y libts0", suppress_message=True):
-        if not shell.run_command("apt-get install -y tslib"):
-            if not shell.run_command("apt-get install -y libts-dev"):
-                warn_exit("Apt failed to install TSLIB!")
-    if not shell.run_command("apt-get install -y bc fbi git python3-dev python3-pip python3-smbus python3-spidev evtest libts-bin device-tree-compiler build-essential python3-evdev"):
+    if not apt_install(required_packages(install_type)):
         warn_exit("Apt failed to install software!")
     return True
 
 def uninstall_bootconfigtxt():
     """Remove any old flexfb/fbtft stuff"""
-    if shell.pattern_search(f"{boot_dir}/config.txt", "adafruit-pitft-helper"):
+    bootconfig = get_bootconfig()
+    if bootconfig.search(HELPER_BLOCK_START):
         print(f"Already have an adafruit-pitft-helper section in {boot_dir}/config.txt.")
         print("Removing old section...")
-        shell.run_command(f"cp {boot_dir}/config.txt {boot_dir}/configtxt.bak")
-        shell.pattern_replace(f"{boot_dir}/config.txt", '\n# --- added by adafruit-pitft-helper.*?\n# --- end adafruit-pitft-helper.*?\n', multi_line=True)
+        bootconfig.backup = True
+        bootconfig.remove_block()
     return True
 
 def uninstall_etc_modules():
     """Remove any old flexfb/fbtft stuff"""
-    shell.run_command('rm -f /etc/modprobe.d/fbtft.conf')
+    shell.remove('/etc/modprobe.d/fbtft.conf')
     shell.pattern_replace("/etc/modules", 'spi-bcm2835')
     shell.pattern_replace("/etc/modules", 'flexfb')
     shell.pattern_replace("/etc/modules", 'fbtft_device')
     # Drop any prior pitft early-load list; install_early_modules() will
     # re-create it for MIPI installs.
-    shell.run_command('rm -f /etc/modules-load.d/pitft.conf')
+    shell.remove('/etc/modules-load.d/pitft.conf')
     return True
 
 def install_early_modules():
@@ -422,6 +907,47 @@ def install_early_modules():
     shell.write_templated_file("/etc/modules-load.d/", "templates/pitft.conf")
     return True
 
+def early_modules():
+    """Return the modules that templates/pitft.conf loads early"""
+    lines = shell.read_text_file("templates/pitft.conf").splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+
+def update_initramfs():
+    """Add the SPI panel driver and firmware to the initramfs, or take them out again, and rebuild it"""
+    if initramfs_mode:
+        print("Adding the SPI panel driver and firmware to the initramfs...")
+        # The hook folders only exist once initramfs-tools is installed, which an image may defer
+        for hook in (INITRAMFS_HOOK, INITRAMFS_KERNEL_HOOK):
+            if not shell.planning:
+                os.makedirs(os.path.dirname(shell.path(hook)), exist_ok=True)
+        shell.write_templated_file(INITRAMFS_HOOK, "templates/initramfs-hook.sh", modules=" ".join(early_modules()), command_bin=mipi_data['command_bin'])
+        shell.chmod(INITRAMFS_HOOK, 0o755)
+        shell.write_templated_file(INITRAMFS_KERNEL_HOOK, "templates/initramfs-kernel-hook.sh")
+        shell.chmod(INITRAMFS_KERNEL_HOOK, 0o755)
+    elif shell.exists(INITRAMFS_HOOK):
+        print("Removing the SPI panel driver from the initramfs...")
+        shell.remove(INITRAMFS_HOOK)
+        shell.remove(INITRAMFS_KERNEL_HOOK)
+    else:
+        return True
+    return rebuild_initramfs()
+
+def initramfs_releases():
+    """Return every kernel release installed on the target, not only the one it boots"""
+    modules = shell.path("/lib/modules")
+    return sorted(os.listdir(modules)) if os.path.isdir(modules) else [shell.release()]
+
+def rebuild_initramfs(create=True):
+    """Rebuild the initramfs of every installed kernel, so any flavour the board boots has the panel hook
+
+    Missing ones are created unless create is False.
+    """
+    for release in initramfs_releases():
+        action = "-u" if not create or shell.exists(f"/boot/initrd.img-{release}") else "-c"
+        if not shell.run_command(f"update-initramfs {action} -k {release}"):
+            return False
+    return True
+
 def use_mipi_driver(config = None):
     """Check if MIPI Overlay is Present"""
     if not config:
@@ -449,57 +975,218 @@ def is_kernel_upgrade_required(config = None):
 
     return True
 
+def compile_overlay(overlay_src, dtc_version=None):
+    """Compile a device tree overlay or reuse a cached build, returning the path to the .dtbo
+
+    Compiled overlays are cached in CACHE_DIR keyed by the source hash and the dtc version.
+    """
+    if dtc_version is None:
+        dtc_version = tool_version("dtc --version")
+    key = hashlib.sha256(f"{file_hash(overlay_src)}\n{dtc_version}".encode()).hexdigest()[:16]
+    name = os.path.basename(overlay_src).rsplit(".", 1)[0]
+    cached_dtbo = f"{CACHE_DIR}/overlays/{name}-{key}.dtbo"
+    if shell.exists(cached_dtbo):
+        return cached_dtbo
+    # Several installers can share the cache when images are prepared in a batch
+    temp_dtbo = f"{cached_dtbo}.{os.getpid()}.tmp"
+    command = f"dtc --warning no-unit_address_vs_reg -I dts -O dtb -o {temp_dtbo} {overlay_src}"
+    if shell.planned("command", command):
+        return cached_dtbo
+    os.makedirs(os.path.dirname(cached_dtbo), exist_ok=True)
+    if not shell.run_host_command(command, suppress_message=True):
+        shell.remove(temp_dtbo)
+        return None
+    os.replace(temp_dtbo, cached_dtbo)
+    return cached_dtbo
+
+def precompile_overlays():
+    """Compile every overlay in the overlays folder into the cache in parallel"""
+    sources = sorted(glob.glob("overlays/*.dts"))
+    dtc_version = tool_version("dtc --version")
+    success = True
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(lambda overlay_src: compile_overlay(overlay_src, dtc_version), sources)
+        for overlay_src, dtbo in zip(sources, results):
+            if dtbo is None:
+                shell.warn(f"Failed to compile {overlay_src}")
+                success = False
+            else:
+                print(f"{overlay_src} -> {dtbo}")
+    return success
+
 def install_drivers():
     """Compile display driver and overlay if required"""
     if "overlay_src" in pitft_config and "overlay_dest" in pitft_config:
         print("Compiling Device Tree Overlay")
         destination = pitft_config['overlay_dest'].format(boot_dir=boot_dir)
-        shell.run_command("dtc --warning no-unit_address_vs_reg -I dts -O dtb -o {dest} {src}".format(dest=destination, src=pitft_config['overlay_src']))
-
-    if use_mipi_driver():
-        mipi_data.update(pitft_config['mipi_data'])
-        if not compile_mipi_fw():
-            shell.bail("Unable to compile MIPI firmware")
+        dtbo = compile_overlay(pitft_config['overlay_src'])
+        if dtbo is None:
+            warn_exit("Unable to compile device tree overlay!")
+        # Avoid needlessly rewriting the boot partition
+        if shell.exists(dtbo) and shell.exists(destination) and filecmp.cmp(dtbo, shell.path(destination), shallow=False):
+            print(f"{destination} is already up to date")
+        else:
+            shell.copy(dtbo, destination)
 
     if is_kernel_upgrade_required():
-        print("############# UPGRADING KERNEL ###############")
-        print("Updating packages...")
-        if not shell.run_command("sudo apt-get update", suppress_message=True):
-            warn_exit("Apt failed to update itself!")
-        print("Upgrading packages...")
-        if not shell.run_command("sudo apt-get -y upgrade"):
-            warn_exit("Apt failed to install software!")
-        print("Installing Kernel Headers. This may take a few minutes...")
-        if not shell.run_command("apt-get install -y raspberrypi-kernel-headers", suppress_message=True):
+        install_kernel_module()
+    return True
+
+def module_source_hash():
+    """Return a hash of the out-of-tree display driver sources"""
+    sha = hashlib.sha256()
+    for path in sorted(glob.glob("st7789_module/*.[ch]") + ["st7789_module/Makefile"]):
+        sha.update(f"{path} {file_hash(path)}\n".encode())
+    return sha.hexdigest()[:16]
+
+def kernel_packages(release):
+    """Return the kernel and firmware packages and the header packages for a kernel release's flavour"""
+    match = KERNEL_FLAVOUR_PATTERN.search(release)
+    if match:
+        flavour = match.group(1)
+        return [f"linux-image-{flavour}", "raspi-firmware"], [f"linux-headers-{flavour}"]
+    return ["raspberrypi-kernel", "raspberrypi-bootloader"], ["raspberrypi-kernel-headers"]
+
+def kernel_headers_installed(release):
+    """Check the modules folder and the dpkg status for headers matching a kernel release"""
+    if shell.isdir(f"/lib/modules/{release}/build"):
+        return True
+    return bool(query_installed_packages([f"linux-headers-{release}"]))
+
+def cached_module_path(release):
+    """Return where the display driver built for a kernel release is cached"""
+    return f"{CACHE_DIR}/modules/{release}/{pitft_config['kernel_module']}-{module_source_hash()}.ko.xz"
+
+def kernel_header_packages():
+    """Return the headers the display driver build needs, if it has to be built
+
+    They are only planned when the lists have them. Otherwise install_kernel_headers()
+    upgrades the kernel packages on their own.
+    """
+    if "overlay_src" not in pitft_config or not pitft_config['kernel_upgrade'] or use_mipi_driver() or shell.root is not None:
+        return []
+    release = shell.release()
+    if shell.exists(cached_module_path(release)) or kernel_headers_installed(release):
+        return []
+    if not query_available_packages([f"linux-headers-{release}"]):
+        return []
+    return [f"linux-headers-{release}"]
+
+def install_kernel_headers(release):
+    """Install headers for a kernel release, upgrading only the kernel packages if the lists have none for it"""
+    if kernel_headers_installed(release):
+        print(f"Kernel headers for {release} are already installed")
+        return True
+    kernel, headers = kernel_packages(release)
+    if not sysupdate():
+        return False
+    if query_available_packages([f"linux-headers-{release}"]):
+        print(f"Installing kernel headers for {release}...")
+        return apt_install([f"linux-headers-{release}"])
+    print("############# UPGRADING KERNEL ###############")
+    print(f"No headers for {release} are available, upgrading {' '.join(kernel + headers)} only...")
+    changed_steps.append("packages")
+    return shell.run_command(f"apt-get install -y {' '.join(kernel + headers)}")
+
+def install_kernel_module():
+    """Build the display driver for the running kernel, or reuse a cached build
+
+    Built modules are cached in CACHE_DIR per kernel release and source hash.
+    """
+    if shell.root is not None:
+        return install_image_kernel_modules()
+    module = pitft_config['kernel_module']
+    release = shell.release()
+    cached_module = cached_module_path(release)
+    if shell.exists(cached_module):
+        print(f"{module} build cache hit for kernel {release}")
+    else:
+        print(f"{module} build cache miss for kernel {release}")
+        if not install_kernel_headers(release):
             warn_exit("Apt failed to install software!")
         # If the kernel was upgraded, a build folder should exist once it has been loaded
-        module = pitft_config['kernel_module']
-        if not shell.isdir(f"/lib/modules/{shell.release()}/build"):
-            warn_exit(f"Kernel headers build folder for {shell.release()}, not found. Please reboot now and re-run script!")
-        print("Compiling and installing display driver...")
+        if not shell.planning and not shell.isdir(f"/lib/modules/{release}/build"):
+            warn_exit(f"Kernel headers build folder for {release}, not found. Please reboot now and re-run script!")
+        print("Compiling display driver...")
         shell.pushd("st7789_module")
-        if not shell.run_command("make"):
+        if not shell.run_command(f"make -j{os.cpu_count()}"):
             warn_exit("Apt failed to compile ST7789V drivers!")
-        shell.run_command(f"mv /lib/modules/{shell.release()}/kernel/drivers/staging/fbtft/{module}.ko.xz /lib/modules/{shell.release()}/kernel/drivers/staging/fbtft/{module}.BACK.xz")
-        shell.run_command(f"xz -v2 {module}.ko")
-        shell.run_command(f"mv {module}.ko.xz /lib/modules/{shell.release()}/kernel/drivers/staging/fbtft/{module}.ko.xz")
+        if not shell.planning:
+            os.makedirs(os.path.dirname(cached_module), exist_ok=True)
+        if not shell.run_command(f"xz -2 -T0 -c {module}.ko > {cached_module}.tmp"):
+            warn_exit(f"Unable to compress {module}.ko!")
         shell.popd()
+        if shell.planned("write", shell.path(installed_module_path(release))):
+            return True
+        os.replace(f"{cached_module}.tmp", cached_module)
+    return install_cached_module(release)
+
+def installed_module_path(release):
+    """Return where the display driver for a kernel release is installed"""
+    return f"/lib/modules/{release}/kernel/drivers/staging/fbtft/{pitft_config['kernel_module']}.ko.xz"
+
+def install_cached_module(release):
+    """Copy the cached display driver for a kernel release into place unless it already is"""
+    module = pitft_config['kernel_module']
+    installed_module = installed_module_path(release)
+    cached_module = cached_module_path(release)
+    if shell.exists(installed_module) and filecmp.cmp(cached_module, shell.path(installed_module), shallow=False):
+        print(f"{module} is already installed for kernel {release}")
+        return True
+    print("Installing display driver...")
+    if shell.exists(installed_module):
+        shell.move(installed_module, f"{os.path.dirname(installed_module)}/{module}.BACK.xz")
+    elif not shell.planning:
+        os.makedirs(os.path.dirname(shell.path(installed_module)), exist_ok=True)
+    shell.copy(cached_module, installed_module)
     return True
 
+def install_image_kernel_modules():
+    """Install the cached display driver for every kernel in an image, and build it on first boot for the rest
+
+    The firmware picks the kernel for the board, which isn't known while preparing the image.
+    """
+    module = pitft_config['kernel_module']
+    missing = []
+    for release in shell.releases():
+        if shell.exists(cached_module_path(release)):
+            print(f"{module} build cache hit for kernel {release}")
+            install_cached_module(release)
+        else:
+            missing.append(release)
+    if not missing:
+        # The module dependency lists are updated for the kernel that boots
+        return shell.run_command("depmod -a")
+    print(f"{module} build cache miss for kernel {' '.join(missing)}, building on first boot if the board runs one of them")
+    source_dir = "/usr/local/src/adafruit-pitft/st7789_module"
+    shell.remove(source_dir)
+    shell.copy("st7789_module", source_dir)
+    # The image's package lists are only fetched on its first boot
+    sysupdate()
+    kernel, headers = kernel_packages(shell.release())
+    changed_steps.append("packages")
+    running_module = installed_module_path("$(uname -r)")
+    return shell.run_command(
+        f"if [ -e {running_module} ]; then depmod -a; else "
+        f"{{ apt-get install -y linux-headers-$(uname -r) || apt-get install -y {' '.join(kernel + headers)}; }} && "
+        f"make -C {source_dir} && xz -2 -c {source_dir}/{module}.ko > {running_module} && depmod -a; fi"
+    )
+
 def update_configtxt(rotation_override=None, tinydrm_install=False):
     """update /boot/firmware/config.txt (or equivalent folder) with appropriate values"""
     uninstall_bootconfigtxt()
     uninstall_etc_modules()
     overlay_key = "overlay"
-    overlay = pitft_config[overlay_key]
-    if "{pitftrot}" in overlay:
-        rotation = str(rotation_override) if rotation_override is not None else pitftrot
-        overlay = overlay.format(pitftrot=rotation)
+    rotation = str(rotation_override) if rotation_override is not None else pitftrot
+    spi_plan = plan_spi(pitft_config, rotation)
+    print("SPI at {:.1f} MHz, {:.1f} ms per frame, {} fps".format(spi_plan["speed"] / 1000000, spi_plan["frame_time"] * 1000, spi_plan["fps"]))
+    overlay = pitft_config[overlay_key].format(pitftrot=rotation, speed=spi_plan["speed"], fps=spi_plan["fps"])
     if use_mipi_driver():
         # Mipi Driver does not work if hdmi_force_hotplug=1 is present
-        shell.pattern_replace(f"{boot_dir}/config.txt", "hdmi_force_hotplug=1", "hdmi_force_hotplug=0")
+        get_bootconfig().replace("hdmi_force_hotplug=1", "hdmi_force_hotplug=0")
         # Use the MIPI Overlay instead
-        overlay = f"dtoverlay=mipi-dbi-spi,{mipi_data['spi']},speed=40000000"
+        spi_plan = plan_spi(pitft_config, rotation, max_speed=mipi_data['speed'])
+        overlay = f"dtoverlay=mipi-dbi-spi,{mipi_data['spi']},speed={spi_plan['speed']}"
         overlay += f"\ndtparam=compatible={mipi_data['command_bin']}\\0panel-mipi-dbi-spi"
         viewport = ""
         if mipi_data['viewport'][pitftrot] is not None:
@@ -511,6 +1198,9 @@ def update_configtxt(rotation_override=None, tinydrm_install=False):
         # panel's framebuffer allocation on 32-bit Pi OS (Pi Zero / Pi 1 /
         # CM1 default this to 1). See issue #341.
         overlay += "\nenable_tvout=0"
+        if initramfs_mode:
+            # The panel driver is loaded from the initramfs
+            overlay += "\nauto_initramfs=1"
 
     if tinydrm_install: # Use overlay params for Wayland
         overlay += ",drm"
@@ -525,7 +1215,7 @@ def update_configtxt(rotation_override=None, tinydrm_install=False):
     config_text_base = shell.load_template("templates/config_text_base.txt", date=shell.date(), overlay=overlay)
     if config_text_base is None:
         shell.bail("Unable to load config_text_base template!")
-    shell.write_text_file(f"{boot_dir}/config.txt", config_text_base)
+    get_bootconfig().add_block(config_text_base)
     return True
 
 def update_udev():
@@ -545,23 +1235,74 @@ def update_udev():
     shell.write_templated_file("/etc/udev/rules.d/", "templates/99-spi-tft-drm.rules")
     return True
 
+def parse_mipi_commands(source):
+    """Parse mipi-dbi-cmd text into a list of (rotation, bytes) entries
+
+    Lines tagged with a "# rotation N" comment are only used for that rotation
+    whether they are commented out or not. Other entries have a rotation of None.
+    """
+    entries = []
+    for number, line in enumerate(source.splitlines(), 1):
+        rotation = None
+        match = MIPI_ROTATION_PATTERN.match(line)
+        if match:
+            line, rotation = match.group(1), match.group(2)
+        else:
+            line = line.split("#", 1)[0]
+        fields = line.split()
+        if not fields:
+            continue
+        try:
+            values = [int(value, 0) for value in fields[1:]]
+        except ValueError:
+            raise ValueError(f"Line {number}: invalid number in '{line.strip()}'")
+        if fields[0] == "command":
+            if not values or not all(0 <= value <= 0xFF for value in values) or len(values) > 0x100:
+                raise ValueError(f"Line {number}: invalid command '{line.strip()}'")
+            data = bytes([values[0], len(values) - 1] + values[1:])
+        elif fields[0] == "delay":
+            if len(values) != 1 or values[0] < 0:
+                raise ValueError(f"Line {number}: invalid delay '{line.strip()}'")
+            data = b""
+            milliseconds = values[0]
+            while milliseconds > 0:
+                data += bytes([MIPI_DBI_DELAY, 1, min(milliseconds, 0xFF)])
+                milliseconds -= 0xFF
+        else:
+            raise ValueError(f"Line {number}: unknown keyword '{fields[0]}'")
+        entries.append((rotation, data))
+    return entries
+
+def mipi_fw_variants(source, rotations=PITFT_ROTATIONS):
+    """Compile mipi-dbi-cmd text into a firmware blob for each rotation in one pass"""
+    entries = parse_mipi_commands(source)
+    header = MIPI_DBI_MAGIC + bytes([MIPI_DBI_VERSION])
+    return {
+        rotation: header + b"".join(data for entry_rotation, data in entries if entry_rotation in (None, rotation))
+        for rotation in rotations
+    }
+
+def write_binary_file(path, content):
+    """Atomically replace a file on the target with the given bytes"""
+    path = shell.path(path)
+    if shell.planned("write", path):
+        return
+    shell.record_write(path)
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(f"{path}.tmp", path)
+
 def compile_mipi_fw():
-    command_src = "mipi/panel.txt"
-
-    # We could just copy the file to panel.txt, edit that, then remove it after
-    shell.copy(f"mipi/{mipi_data['command_bin']}.txt", command_src)
-
-    # Make sure each of the lines with "# rotation" starts with exactly 1 # and no more
-    shell.pattern_replace(command_src, "^#*(.*?# rotation.*?$)", "#\\1")
-    # Uncomment the one for the rotation we are going for
-    shell.pattern_replace(command_src, "^#(.*?# rotation " + pitftrot + ".*?$)", "\\1")
-    # Download the mipi-dbi-cmd script if it doesn't exist
-    if not shell.exists("mipi-dbi-cmd"):
-        shell.run_command("wget https://raw.githubusercontent.com/notro/panel-mipi-dbi/main/mipi-dbi-cmd")
-        shell.run_command("chmod +x mipi-dbi-cmd")
-    # Run the mipi-dbi-script and output directly to the /lib/firmware folder
-    shell.run_command(f"./mipi-dbi-cmd /lib/firmware/{mipi_data['command_bin']}.bin mipi/panel.txt")
-    shell.remove(command_src)
+    """Compile the panel commands straight into /lib/firmware"""
+    command_src = f"mipi/{mipi_data['command_bin']}.txt"
+    try:
+        variants = mipi_fw_variants(shell.read_text_file(command_src))
+    except (FileNotFoundError, ValueError) as error:
+        shell.warn(f"Unable to compile {command_src}: {error}")
+        return False
+    write_binary_file(f"/lib/firmware/{mipi_data['command_bin']}.bin", variants[pitftrot])
     return True
 
 def update_pointercal():
@@ -574,16 +1315,133 @@ def update_pointercal():
         shell.remove("/etc/pointercal")
     return True
 
+def enable_service(service):
+    """Enable a systemd unit, recording it so uninstall disables it again unless it already was enabled"""
+    if (shell.run_command(f"systemctl is-enabled {service}", suppress_message=True, return_output=True) or "").strip() != "enabled":
+        enabled_services.append(service)
+    return shell.run_command(f"systemctl enable {service}")
+
+def set_boot_behaviour(behaviour):
+    """Change the raspi-config boot behaviour, remembering the one the system had"""
+    global previous_boot_behaviour
+    if previous_boot_behaviour is None:
+        cli = shell.run_command("raspi-config nonint get_boot_cli", suppress_message=True, return_output=True) or ""
+        autologin = shell.run_command("raspi-config nonint get_autologin", suppress_message=True, return_output=True) or ""
+        previous_boot_behaviour = BOOT_BEHAVIOURS.get((cli.strip(), autologin.strip()))
+    shell.run_raspi_config(f"do_boot_behaviour {behaviour}")
+
+def install_scripts(*scripts):
+    """Copy helper scripts from this repo into /usr/local/bin on the target"""
+    for script in scripts:
+        shell.copy(script, f"/usr/local/bin/{script}")
+        shell.chmod(f"/usr/local/bin/{script}", 0o755)
+    return True
+
+def console_font_size():
+    """Return the Terminus size that fits about 40 columns across the panel's short side"""
+    short_side = min(pitft_config["width"], pitft_config["height"])
+    return next((size for limit, size in CONSOLE_FONT_SIZES if short_side <= limit), CONSOLE_FONT_SIZES[-1][1])
+
+def console_font_file(size):
+    """Return the console-setup font file for a Terminus size in the configured code set"""
+    settings = shell.read_text_file("/etc/default/console-setup") if shell.exists("/etc/default/console-setup") else ""
+    match = re.search(r'^CODESET="?([^"\s]*)', settings, re.MULTILINE)
+    codeset = match.group(1) if match and match.group(1) not in ("", "guess") else "Uni2"
+    width, height = size.split("x")
+    # 8 pixel wide fonts are named by their height alone, e.g. Terminus16
+    name = height if width == "8" else f"{height}x{width}"
+    return f"{CONSOLE_FONT_DIR}/{codeset}-Terminus{name}.psf.gz"
+
+def cache_console_font(size):
+    """Save the console font and keymap now so the boot time helper only has to load the font"""
+    # console-setup.service reuses the cached keymap and font instead of regenerating them
+    shell.run_command(SETUPCON_SAVE, suppress_message=True)
+    font = console_font_file(size)
+    if not shell.exists(font):
+        print(f"{font} not found, the console helper will fall back to setupcon")
+        shell.remove(CONSOLE_FONT_CACHE)
+        return
+    shell.copy(font, CONSOLE_FONT_CACHE)
+
+def splash_size():
+    """Return the size of the panel framebuffer at the selected rotation"""
+    if use_mipi_driver():
+        return display_size(pitft_config, pitftrot)
+    # The drivers rotate the framebuffer itself, the sizes in the config are for 90 degrees
+    width, height = pitft_config["width"], pitft_config["height"]
+    return (width, height) if pitftrot in ("90", "270") else (height, width)
+
+def splash_source():
+    """Return the image given with --splash, or the copy kept by an earlier install"""
+    if splash_image is not None or drop_splash:
+        return splash_image
+    return shell.path(SPLASH_SOURCE) if shell.exists(SPLASH_SOURCE) else None
+
+def remove_splash():
+    """Disable and remove the boot splash, keeping the source for a later console install"""
+    if shell.exists("/etc/systemd/system/pitft-splash.service"):
+        print("Removing boot splash...")
+        shell.run_command("systemctl disable pitft-splash.service")
+        shell.remove("/etc/systemd/system/pitft-splash.service")
+        shell.remove(pitft_splash.SPLASH_FILE)
+    return True
+
+def update_splash():
+    """Install the boot splash as a raw buffer for the panel, or remove it when there is none"""
+    source = splash_source()
+    if source is None:
+        if drop_splash:
+            shell.remove(SPLASH_SOURCE)
+        return remove_splash()
+    width, height = splash_size()
+    print(f"Converting {source} into a {width}x{height} boot splash...")
+    data = None
+    if not shell.planning:
+        # Pillow may only be installed by the plan being printed
+        try:
+            data = pitft_splash.convert_image(source, (width, height))
+        except (RuntimeError, OSError) as error:
+            shell.warn(f"Unable to convert {source}: {error}")
+            return False
+        os.makedirs(os.path.dirname(shell.path(pitft_splash.SPLASH_FILE)), exist_ok=True)
+    write_binary_file(pitft_splash.SPLASH_FILE, data)
+    if source == splash_image:
+        with open(splash_image, "rb") as file:
+            write_binary_file(SPLASH_SOURCE, file.read())
+    install_scripts("drm_inventory.py", "pitft_splash.py")
+    shell.write_templated_file("/etc/systemd/system/", "templates/pitft-splash.service", size=f"{width}x{height}", display_type=pitft_config["display_type"])
+    shell.run_command("systemctl daemon-reload")
+    enable_service("pitft-splash.service")
+    return True
+
 def install_console():
     print("Installing console fbcon map helper...")
     display_type = pitft_config["display_type"]
-    shell.write_templated_file("/usr/local/bin/", "templates/con2fbmap-helper.sh", display_type=display_type)
+    install_scripts("drm_inventory.py")
+
+    # Set the console font to Terminus sized for the panel, 6x12 for 240px.
+    # 6px-wide glyphs give 40 cols across a 240px PiTFT - more readable
+    # text density than 8x16's 30 cols. The grid-vs-font mismatch that used
+    # to leave the right ~25% of the panel unpainted at the shell prompt
+    # (issue #341) is handled by con2fbmap-helper.sh loading the cached
+    # font after fbcon attaches to the SPI framebuffer.
+    font_size = console_font_size()
+    shell.reconfig("/etc/default/console-setup", "^.*FONTFACE.*$", "FONTFACE=\"Terminus\"")
+    shell.reconfig("/etc/default/console-setup", "^.*FONTSIZE.*$", f"FONTSIZE=\"{font_size}\"")
+    cache_console_font(font_size)
+
+    # setupcon ran twice at every boot before the font was cached. Read the
+    # estimate only now, so it includes the run cache_console_font just timed
+    setupcon_ms = round(shell.estimate(SETUPCON_SAVE)[0] * 2000)
+    shell.write_templated_file("/usr/local/bin/", "templates/con2fbmap-helper.sh", display_type=display_type, console_font=CONSOLE_FONT_CACHE, setupcon_ms=setupcon_ms)
     shell.chmod("/usr/local/bin/con2fbmap-helper.sh", "+x")
 
     print("Installing console fbcon map service...")
+    # con2fbmap.service is started by the device unit created from the spitft symlink
+    shell.write_templated_file("/etc/udev/rules.d/", "templates/99-spi-tft-drm.rules")
     shell.write_templated_file("/etc/systemd/system/", "templates/con2fbmap.service")
     shell.run_command("systemctl daemon-reload")
-    shell.run_command("systemctl enable con2fbmap.service")
+    enable_service("con2fbmap.service")
     shell.run_command("systemctl restart con2fbmap.service")
 
     print("Turning off console blanking")
@@ -594,21 +1452,12 @@ def install_console():
     # adding new version
     shell.pattern_replace("/etc/rc.local", '^exit 0', "# disable console blanking on PiTFT\\nsudo sh -c \"TERM=linux setterm -blank 0 >/dev/tty0\"\\nexit 0")
 
-    # Set the console font to Terminus 6x12. 6px-wide glyphs give 40
-    # cols across a 240px PiTFT - more readable text density than 8x16's
-    # 30 cols. The grid-vs-font mismatch that used to leave the right
-    # ~25% of the panel unpainted at the shell prompt (issue #341) is
-    # handled by con2fbmap-helper.sh re-running setupcon after fbcon
-    # attaches to the SPI framebuffer.
-    shell.reconfig("/etc/default/console-setup", "^.*FONTFACE.*$", "FONTFACE=\"Terminus\"")
-    shell.reconfig("/etc/default/console-setup", "^.*FONTSIZE.*$", "FONTSIZE=\"6x12\"")
-
     print("Setting raspi-config to boot to console w/o login...")
     shell.chdir(target_homedir)
-    shell.run_raspi_config("do_boot_behaviour B2")
+    set_boot_behaviour("B2")
 
     # remove fbcp
-    shell.pattern_replace("/etc/rc.local", "^.*fbcp.*$")
+    shell.pattern_replace("/etc/rc.local", "^.*(fbcp|pitft_mirror).*$")
     return True
 
 def uninstall_console():
@@ -632,6 +1481,8 @@ def uninstall_console():
     if shell.exists("/usr/local/bin/con2fbmap-helper.sh"):
         print("Removing console fbcon map helper...")
         shell.remove("/usr/local/bin/con2fbmap-helper.sh")
+    shell.remove(CONSOLE_FONT_CACHE)
+    remove_splash()
 
     if shell.exists("/etc/rc.local"):
         shell.pattern_replace("/etc/rc.local", '^# disable console blanking.*')
@@ -639,92 +1490,72 @@ def uninstall_console():
     return True
 
 def install_mirror():
-    global mirror_rotations
-    print("Installing cmake...")
-    if not shell.run_command("apt-get --yes --allow-downgrades --allow-remove-essential --allow-change-held-packages install cmake", suppress_message=True):
-        warn_exit("Apt failed to install software!")
-    print("Downloading rpi-fbcp...")
-    shell.pushd("/tmp")
-    shell.run_command("curl -sLO https://github.com/adafruit/rpi-fbcp/archive/master.zip")
-    print("Uncompressing rpi-fbcp...")
-    shell.run_command("rm -rf /tmp/rpi-fbcp-master")
-    if not shell.run_command("unzip master.zip", suppress_message=True):
-        warn_exit("Failed to uncompress fbcp!")
-    shell.chdir("rpi-fbcp-master")
-    shell.run_command("mkdir build")
-    shell.chdir("build")
-    print("Building rpi-fbcp...")
-    shell.write_text_file("../CMakeLists.txt", "\nset (CMAKE_C_FLAGS \"-std=gnu99 ${CMAKE_C_FLAGS}\")")
-    if not shell.run_command("cmake ..", suppress_message=True):
-        warn_exit("Failed to cmake fbcp!")
-    if not shell.run_command("make", suppress_message=True):
-        warn_exit("Failed to make fbcp!")
-    print("Installing rpi-fbcp...")
-    shell.run_command("install fbcp /usr/local/bin/fbcp")
-    shell.popd()
-    shell.run_command("rm -rf /tmp/rpi-fbcp-master")
-
-    if "mirror_rotations" in pitft_config:
-        mirror_rotations = pitft_config['mirror_rotations']
+    print("Installing PiTFT mirror...")
+    # python3-numpy and python3-click are part of the softwareinstall() plan
+    if not install_scripts("drm_inventory.py", "pitft_mirror.py"):
+        warn_exit("Failed to install pitft_mirror.py!")
+    # pitft_mirror.py replaces rpi-fbcp, so drop its binary and build cache
+    shell.remove("/usr/local/bin/fbcp")
+    if not shell.planning:
+        shutil.rmtree(f"{CACHE_DIR}/fbcp", ignore_errors=True)
 
     # Start fbcp in the appropriate place, depending on init system:
-    if SYSTEMD:
+    if not SYSTEMD:
         # Add fbcp to /etc/rc.local:
         print("We have sysvinit, so add fbcp to /etc/rc.local...")
-        if shell.pattern_search("/etc/rc.local", "fbcp"):
+        if shell.pattern_search("/etc/rc.local", "fbcp|pitft_mirror"):
             # fbcp already in rc.local, but make sure correct:
-            shell.pattern_replace("/etc/rc.local", "^.*fbcp.*$", "/usr/local/bin/fbcp \&")
+            shell.pattern_replace("/etc/rc.local", "^.*(fbcp|pitft_mirror).*$", "/usr/local/bin/pitft_mirror.py &")
         else:
             # Insert fbcp into rc.local before final 'exit 0':
-            shell.pattern_replace("/etc/rc.local", "^exit 0", "/usr/local/bin/fbcp \&\\nexit 0")
+            shell.pattern_replace("/etc/rc.local", "^exit 0", "/usr/local/bin/pitft_mirror.py &\\nexit 0")
     else:
         # Install fbcp systemd service, first making sure it's not in rc.local:
         uninstall_fbcp_rclocal()
         print("We have systemd, so install fbcp systemd service...")
         if not install_fbcp_service():
             shell.bail("Unable to install fbcp service file")
-        shell.run_command("sudo systemctl enable fbcp.service")
-
-    # if desktop environment is installed...
-    if is_desktop:
-        print("Setting raspi-config to boot to desktop w/o login...")
-        shell.run_raspi_config("do_boot_behaviour B4")
+        enable_service("fbcp.service")
 
     # Disable overscan compensation (use full screen):
-    shell.run_raspi_config("do_overscan 1")
-    # Set up HDMI parameters:
-    print("Configuring boot/config.txt for forced HDMI")
-    shell.reconfig(f"{boot_dir}/config.txt", "^.*hdmi_force_hotplug.*$", "hdmi_force_hotplug=1")
-    shell.reconfig(f"{boot_dir}/config.txt", "^.*hdmi_group.*$", "hdmi_group=2")
-    shell.reconfig(f"{boot_dir}/config.txt", "^.*hdmi_mode.*$", "hdmi_mode=87")
+    set_overscan(False)
+    # HDMI stays at its native mode. pitft_mirror.py scales it onto the PiTFT with a
+    # precomputed gather map, so only make sure HDMI is enabled and remove any forced
+    # mode left by older versions of this script. The overlay already rotates the
+    # panel framebuffer, so the mirror turns HDMI only when one of them is portrait.
+    print("Configuring boot/config.txt for native HDMI")
+    bootconfig = get_bootconfig()
+    bootconfig.reconfig("^.*hdmi_force_hotplug.*$", "hdmi_force_hotplug=1")
+    bootconfig.replace('^hdmi_group=2.*$')
+    bootconfig.replace('^hdmi_mode=87.*$')
+    bootconfig.replace('^hdmi_cvt=.*$')
+    bootconfig.replace('^display_hdmi_rotate=.*$')
+    return True
 
-    # if using the desktop version, update driver scale...
-    scale = 1
-    if is_desktop:
-        if "display_scale" in pitft_config:
-            scale = pitft_config["display_scale"]
-        else:
-            scale = 2
-    WIDTH = int(pitft_config['width'] * scale)
-    HEIGHT = int(pitft_config['height'] * scale)
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(65536), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
 
-    shell.reconfig(f"{boot_dir}/config.txt", "^.*hdmi_cvt.*$", "hdmi_cvt={} {} 60 1 0 0 0".format(WIDTH, HEIGHT))
+def tool_version(command):
+    """Return the first line of a tool's version output for use in cache keys"""
+    output = shell.run_host_command(f"{command} 2>&1", suppress_message=True, return_output=True)
+    return output.strip().splitlines()[0] if output and output.strip() else "unknown"
 
-    try:
-        default_orientation = int(list(mirror_rotations.keys())[list(mirror_rotations.values()).index("0")])
-    except ValueError:
-        default_orientation = 90
+def save_desktop_config(config, path):
+    """Write a parsed kanshi or wayfire config back to the target if it changed
 
-    if mirror_rotations[pitftrot] == "0":
-        # dont rotate HDMI on default orientation
-        shell.reconfig(f"{boot_dir}/config.txt", "^.*display_hdmi_rotate.*$", "")
-    else:
-        display_rotate = mirror_rotations[pitftrot]
-        shell.reconfig(f"{boot_dir}/config.txt", "^.*display_hdmi_rotate.*$", "display_hdmi_rotate={}".format(display_rotate))
-        # Because we rotate HDMI we have to 'unrotate' the TFT by overriding pitftrot!
-        if not update_configtxt(rotation=default_orientation):
-            shell.bail(f"Unable to update {boot_dir}/config.txt")
-    return True
+    The write goes through the shell, so it is fingerprinted and recorded in the manifest.
+    """
+    content = config.serialize()
+    if content == config.original and shell.exists(path):
+        return
+    if not shell.planning:
+        os.makedirs(os.path.dirname(shell.path(path)), exist_ok=True)
+    shell.write_text_file(path, content, append=False)
 
 def update_wayland_settings():
     # Set the scale factor for Wayland, which is the reciprocal of the X11 scale factor
@@ -738,58 +1569,42 @@ def update_wayland_settings():
     if manager == "wayfire":
         ### WAYFIRE ###
         wayfire_config = f"{target_homedir}/.config/wayfire.ini"
+        config = wayland_config.WayfireConfig.load(shell.path(wayfire_config))
         # Remove any existing settings previously added by this script
-        shell.pattern_replace(wayfire_config, '\n# --- added by adafruit-pitft-helper.*?\n# --- end adafruit-pitft-helper.*?\n', multi_line=True)
-        shell.write_text_file(wayfire_config, f"""
-# --- added by adafruit-pitft-helper {date} ---
-[output:{device_name}]
-scale = {scale}
-# --- end adafruit-pitft-helper {date} ---
-""")
+        config.remove_helper_blocks()
+        config.set_output(device_name, {"scale": scale}, date)
+        save_desktop_config(config, wayfire_config)
 
     elif manager == "labwc":
         ### LABWC (Using Kanshi) ###
         # See https://man.archlinux.org/man/kanshi.5.en for more information on kanshi config files
         labwc_config = f"{target_homedir}/.config/kanshi/config"
+        config = wayland_config.KanshiConfig.load(shell.path(labwc_config))
 
         # If the config file doesn't exist or doesn't contain profile, enumerate the devices and create a new profile
-        if not shell.exists(labwc_config) or not shell.pattern_search(labwc_config, "^profile"):
-            drm_devices = get_drm_devices(connected_only=True)
-            profile_content = "profile {"
-            for device in drm_devices:
-                device_name = device["name"]
-                mode = device["modes"][0]
-                device_refresh = "@60.000"
-                device_scale = ""
-                if device_name == "SPI-1":
-                    device_refresh = ""  # For SPI displays, we don't specify refresh rate
-                    device_scale = f" scale {scale}"
-
-                profile_content += f"\n\t\toutput {device_name} enable mode {mode}{device_refresh} transform normal{device_scale}"
-            profile_content += "\n}\n"
-            shell.write_text_file(labwc_config, profile_content, append=True)
-        else:
-            profiles = shell.pattern_search(labwc_config, r"(profile(?: .*)?) {([\S\s]*?)}", multi_line=True, return_match=True, find_all=True)
-            if profiles:
-                for profile in profiles:
-                    profile_name = profile[0].strip()
-                    profile_content = profile[1].strip()
-                    # Check if the profile already has an output section for the device
-                    if not shell.pattern_search(profile_content, f"(output {device_name}.*)"):
-                        # If not, add the output section for the device
-                        width, height = pitft_config["width"], pitft_config["height"]
-                        new_output_device = f"\t\toutput {device_name} enable mode {width}x{height} transform normal scale {scale}\n"
-                        # insert the new output device line into the profile content
-                        profile_content += new_output_device
-                        # Replace the profile with the updated content
-                        shell.pattern_replace(labwc_config, f"^{profile_name} {{([\S\s]*?)}}", f"{profile_name}: {{{profile_content}}}", multi_line=True)
-
-            # Remove scaling from any existing scale settings for the device
-            shell.pattern_replace(labwc_config, f"(output {device_name}.*) scale [0-9](?:\.[0-9]+)?(.*)", r"\1\2")
-            # Add new scale to the end of the line
-            shell.pattern_replace(labwc_config, f"(output {device_name}.*)", r"\1 scale " + f"{scale}")
+        if not config.profiles:
+            profile = config.add_profile()
+            for device in get_drm_devices(connected_only=True):
+                options = ["enable", "mode", device["modes"][0] + "@60.000", "transform", "normal"]
+                if device["name"] == device_name:
+                    # For SPI displays, we don't specify refresh rate
+                    options = ["enable", "mode", device["modes"][0], "transform", "normal", "scale", str(scale)]
+                profile.add_output(device["name"], options)
+        # Every profile gets the SPI output, which also covers images whose displays can't be enumerated
+        width, height = pitft_config["width"], pitft_config["height"]
+        for profile in config.profiles:
+            output = profile.find_output(device_name)
+            if output is None:
+                profile.add_output(device_name, ["enable", "mode", f"{width}x{height}", "transform", "normal", "scale", str(scale)])
+            else:
+                output.set("scale", str(scale))
+        # Unchanged profiles are written back exactly as they were read
+        save_desktop_config(config, labwc_config)
+    return True
 
 def install_fbcp_service():
+    # fbcp.service is started by the device unit created from the spitft symlink
+    shell.write_templated_file("/etc/udev/rules.d/", "templates/99-spi-tft-drm.rules")
     shell.write_templated_file("/etc/systemd/system/", "templates/fbcp.service")
     return True
 
@@ -799,21 +1614,22 @@ def uninstall_fbcp():
     if shell.exists("/etc/systemd/system/fbcp.service"):
         shell.run_command("sudo systemctl disable fbcp.service")
     # Set up HDMI parameters:
-    shell.run_raspi_config("do_overscan 0")
+    set_overscan(True)
     print("Configuring boot/config.txt for default HDMI")
-    shell.reconfig(f"{boot_dir}/config.txt", "^.*hdmi_force_hotplug.*$", "hdmi_force_hotplug=0")
-    shell.pattern_replace(f"{boot_dir}/config.txt", "^.*#.*dtoverlay=vc4-kms-v3d.*$", "dtoverlay=vc4-kms-v3d")
-    shell.pattern_replace(f"{boot_dir}/config.txt", "^.*#.*dtoverlay=vc4-fkms-v3d.*$", "dtoverlay=vc4-fkms-v3d")
-    shell.pattern_replace(f"{boot_dir}/config.txt", '^hdmi_group=2.*$')
-    shell.pattern_replace(f"{boot_dir}/config.txt", '^hdmi_mode=87.*$')
-    shell.pattern_replace(f"{boot_dir}/config.txt", '^hdmi_cvt=.*$')
+    bootconfig = get_bootconfig()
+    bootconfig.reconfig("^.*hdmi_force_hotplug.*$", "hdmi_force_hotplug=0")
+    bootconfig.replace("^.*#.*dtoverlay=vc4-kms-v3d.*$", "dtoverlay=vc4-kms-v3d")
+    bootconfig.replace("^.*#.*dtoverlay=vc4-fkms-v3d.*$", "dtoverlay=vc4-fkms-v3d")
+    bootconfig.replace('^hdmi_group=2.*$')
+    bootconfig.replace('^hdmi_mode=87.*$')
+    bootconfig.replace('^hdmi_cvt=.*$')
 
     return True
 
 def uninstall_fbcp_rclocal():
     """Remove fbcp from /etc/rc.local:"""
     print("Remove fbcp from /etc/rc.local, if it's there...")
-    shell.pattern_replace("/etc/rc.local", '^.*fbcp.*$')
+    shell.pattern_replace("/etc/rc.local", '^.*(fbcp|pitft_mirror).*$')
     return True
 
 def update_xorg():
@@ -838,6 +1654,61 @@ EndSection
     )
     return True
 
+def spi_core_clock():
+    """Return the clock the SPI controller divides down on this Pi"""
+    try:
+        model = shell.read_text_file("/proc/device-tree/model")
+    except (FileNotFoundError, UnicodeDecodeError):
+        model = ""
+    for name, clock in SPI_CORE_CLOCKS:
+        if name in model:
+            return clock
+    return SPI_DEFAULT_CORE_CLOCK
+
+def display_size(display_config, rotation):
+    """Return the panel area in pixels that is sent over SPI for a rotation"""
+    viewport = display_config.get("mipi_data", {}).get("viewport", {}).get(rotation)
+    if viewport:
+        params = dict(param.split("=") for param in viewport.split(","))
+        if "width" in params and "height" in params:
+            return int(params["width"]), int(params["height"])
+    return display_config["width"], display_config["height"]
+
+def plan_spi(display_config, rotation, core_clock=None, max_speed=None):
+    """Pick the highest SPI speed and the highest frame rate it can sustain
+
+    Each frame is width x height RGB565 pixels sent in DMA transfers of at most
+    SPI_MAX_TRANSFER bytes, plus a fixed per frame command overhead.
+    """
+    if core_clock is None:
+        core_clock = spi_core_clock()
+    if max_speed is None:
+        max_speed = SPI_MAX_SPEED.get(display_config["display_type"], SPI_DEFAULT_CORE_CLOCK // 8)
+    max_speed = min(max_speed, display_config.get("spi_max_speed", max_speed))
+    divisor = max(2, math.ceil(core_clock / max_speed))
+    divisor += divisor % 2
+    speed = core_clock // divisor
+    width, height = display_size(display_config, rotation)
+    frame_bytes = width * height * 2
+    frame_time = (
+        frame_bytes * 8 / speed +
+        math.ceil(frame_bytes / SPI_MAX_TRANSFER) * SPI_TRANSFER_OVERHEAD +
+        SPI_FRAME_OVERHEAD
+    )
+    fps = max(1, min(SPI_MAX_FPS, int(SPI_HEADROOM / frame_time)))
+    return {"speed": speed, "fps": fps, "frame_time": frame_time, "frame_bytes": frame_bytes}
+
+def print_spi_report():
+    """Print the planned SPI speed, frame time and frame rate for every display and rotation"""
+    print("{:<24} {:>4} {:<10} {:>8} {:>9} {:>10} {:>4}".format("Display", "Rot", "Pi", "Bytes", "Speed", "Frame", "FPS"))
+    for item in config:
+        for rotation in PITFT_ROTATIONS:
+            for model, core_clock in SPI_REPORT_MODELS:
+                plan = plan_spi(item, rotation, core_clock)
+                print("{:<24} {:>4} {:<10} {:>8} {:>6.1f}MHz {:>8.1f}ms {:>4}".format(
+                    item["type"], rotation, model, plan["frame_bytes"],
+                    plan["speed"] / 1000000, plan["frame_time"] * 1000, plan["fps"]))
+
 def get_config_types():
     types = []
     for item in config:
@@ -850,16 +1721,137 @@ def get_config(type):
             return item
     return None
 
+def live_commands():
+    """Translate the helper block in config.txt into dtparam and dtoverlay commands
+
+    The dtparam lines that follow a dtoverlay line are its parameters, which
+    at runtime are passed to dtoverlay itself. Firmware settings such as
+    hdmi_force_hotplug only take effect at boot and are left out.
+    Returns the commands and the names of the overlays they load.
+    """
+    lines = get_bootconfig().lines
+    start = next((i for i, line in enumerate(lines) if line.startswith(HELPER_BLOCK_START)), None)
+    if start is None:
+        return [], []
+    commands = []
+    overlays = []
+    for line in lines[start + 1:]:
+        if line.startswith(HELPER_BLOCK_END):
+            break
+        setting = line.split("#", 1)[0].strip()
+        if "=" not in setting:
+            continue
+        key, value = setting.split("=", 1)
+        if key == "dtoverlay":
+            name, *params = value.split(",")
+            overlays.append(name)
+            commands.append(["dtoverlay", name] + params)
+        elif key == "dtparam" and overlays:
+            commands[-1] += value.split(",")
+        elif key == "dtparam":
+            commands.append(["dtparam"] + value.split(","))
+    return [" ".join(shlex.quote(word) for word in command) for command in commands], overlays
+
+def live_modules():
+    """Return the panel driver modules to reload, the one that uses the others first"""
+    if use_mipi_driver():
+        return ["panel_mipi_dbi"]
+    if "kernel_module" in pitft_config:
+        return [pitft_config["kernel_module"], "fbtft"]
+    return []
+
+def live_blocker():
+    """Return why the settings can't be applied to the running system, or None if they can"""
+    if shell.root is not None:
+        return "the install went into an image"
+    if pitft_config is None:
+        return "there is no display to load"
+    if not shell.run_command("which dtoverlay", suppress_message=True):
+        return "dtoverlay is not available"
+    if not live_commands()[1]:
+        return f"there is no overlay in {boot_dir}/config.txt"
+    if "kernel_module" in pitft_config and not use_mipi_driver():
+        if not shell.exists(installed_module_path(shell.release())):
+            return "the display driver is not built for the running kernel yet"
+    return None
+
+def apply_live(install_type):
+    """Load the overlay and panel driver into the running kernel and remap the console
+
+    Returns False if a reboot is still needed.
+    """
+    reason = live_blocker()
+    if reason is not None:
+        print(f"Unable to apply the settings without a reboot: {reason}.")
+        return False
+    start_time = time.monotonic()
+    commands, overlays = live_commands()
+    print("Applying the settings to the running system...")
+    if install_type == "mirror" and shell.exists("/etc/systemd/system/fbcp.service"):
+        shell.run_command("systemctl stop fbcp.service")
+    for overlay in overlays:
+        shell.run_command(f"dtoverlay -r {overlay} 2>/dev/null || true", suppress_message=True)
+    modules = live_modules()
+    if modules:
+        # Reloading makes the driver read the new firmware and parameters
+        shell.run_command(f"modprobe -r {' '.join(modules)} 2>/dev/null || true", suppress_message=True)
+        if os.path.isdir(f"/sys/module/{modules[0]}"):
+            print(f"Unable to apply the settings without a reboot: {modules[0]} is still in use.")
+            return False
+        if "fbtft" in modules:
+            shell.run_command("depmod -a")
+        for module in reversed(modules):
+            if not shell.run_command(f"modprobe {module}"):
+                return False
+    for command in commands:
+        if not shell.run_command(command):
+            print("Unable to apply the settings without a reboot: loading the overlay failed.")
+            return False
+    deadline = time.monotonic() + LIVE_PROBE_TIMEOUT
+    while (framebuffer := drm_inventory.find_spi_framebuffer(drm_inventory.scan(), pitft_config["display_type"])) is None:
+        if time.monotonic() > deadline:
+            print(f"Unable to apply the settings without a reboot: the panel did not probe within {LIVE_PROBE_TIMEOUT} seconds.")
+            return False
+        time.sleep(0.1)
+    if "touchscreen" in pitft_config:
+        shell.run_command("udevadm control --reload-rules && udevadm trigger --subsystem-match=input --action=change")
+    if install_type == "console":
+        shell.run_command("systemctl restart con2fbmap.service")
+    elif install_type == "mirror" and shell.exists("/etc/systemd/system/fbcp.service"):
+        shell.run_command("systemctl start fbcp.service")
+    print("Panel running on /dev/fb{} after {:.1f} seconds, no reboot needed.".format(framebuffer["number"], time.monotonic() - start_time))
+    return True
+
 def uninstall():
     shell.info("Uninstalling PiTFT")
+    manifest = get_manifest()
+    if manifest is not None:
+        revert_manifest(manifest)
+        success()
+    # Installs from before the manifest existed are removed the old way
+    print("No install manifest found, removing everything this script may have installed")
     uninstall_bootconfigtxt()
     uninstall_console()
     uninstall_fbcp()
     uninstall_etc_modules()
+    update_initramfs()
+    shell.remove(os.path.dirname(STATE_FILE))
     success()
 
-def success():
+def success(install_type=None):
     global auto_reboot
+    commit_bootconfig()
+    if shell.planning:
+        shell.print_plan()
+        shell.exit()
+    if install_type is not None:
+        save_applied_state()
+        save_manifest(install_type)
+    if live_mode and install_type is not None:
+        if apply_live(install_type):
+            shell.info("Success!")
+            shell.exit()
+        print("Falling back to a reboot.")
     shell.info("Success!")
     print("""
 Settings take effect on next boot.
@@ -873,23 +1865,108 @@ Settings take effect on next boot.
     shell.reboot()
     shell.exit()
 
+def update_console(install_type):
+    """Give the console or the desktop to the PiTFT depending on the install type"""
+    if install_type == "console":
+        shell.info("Updating console to PiTFT...")
+        if not uninstall_fbcp():
+            shell.bail("Unable to uninstall fbcp")
+        if not install_console():
+            shell.bail("Unable to configure console")
+    else:
+        shell.info("Making sure console doesn't use PiTFT")
+        if not uninstall_console():
+            shell.bail("Unable to uninstall console")
+
+        # With wayland, PiTFT shows up as an additional display rather than a mirror
+        if install_type == "mirror" and is_desktop:
+            shell.info("Updating Wayland desktop settings...")
+            update_wayland_settings()
+        elif install_type == "mirror":
+            # Without a desktop the HDMI console is copied onto the PiTFT
+            if not install_mirror():
+                shell.bail("Unable to install the PiTFT mirror")
+        else:
+            if not uninstall_fbcp():
+                shell.bail("Unable to uninstall fbcp")
+    return True
+
+def update_rotation(inputs, install_type):
+    """Regenerate everything that depends on the rotation, each as its own step"""
+    inputs = dict(inputs, rotation=pitftrot)
+    shell.info(f"Updating {boot_dir}/config.txt...")
+    use_tinydrm = install_type != "console"
+    if not run_step("config.txt", dict(inputs, tinydrm=use_tinydrm, initramfs=initramfs_mode, core_clock=spi_core_clock()), update_configtxt, None, use_tinydrm):
+        shell.bail(f"Unable to update {boot_dir}/config.txt")
+
+    if use_mipi_driver():
+        # update_configtxt() drops the early load list, so it is checked right after
+        shell.info("Configuring early module load for SPI MIPI panel...")
+        if not run_step("Early module load", dict(inputs, rotation=None), install_early_modules):
+            shell.bail("Unable to write /etc/modules-load.d/pitft.conf")
+
+        shell.info("Compiling MIPI panel firmware...")
+        if not run_step("Panel firmware", inputs, compile_mipi_fw):
+            shell.bail("Unable to compile MIPI firmware")
+
+        # The initramfs holds a copy of the firmware for this rotation
+        shell.info("Updating the initramfs...")
+        if not run_step("Initramfs", dict(inputs, initramfs=initramfs_mode, kernel=" ".join(initramfs_releases())), update_initramfs):
+            shell.bail("Unable to update the initramfs")
+    elif initramfs_mode:
+        print("Loading the panel driver from the initramfs is only supported for MIPI panels")
+
+    if "touchscreen" in pitft_config:
+        shell.info("Updating SysFS rules for Touchscreen...")
+        if not run_step("Touchscreen rules", inputs, update_udev):
+            shell.bail("Unable to update /etc/udev/rules.d")
+
+        shell.info("Updating TSLib default calibration...")
+        if not run_step("Touchscreen calibration", inputs, update_pointercal):
+            shell.bail("Unable to update /etc/pointercal")
+
+        if install_type == "mirror" and is_desktop:
+            shell.info("Updating Desktop Touch calibration...")
+            if not run_step("Desktop touch calibration", inputs, update_xorg):
+                shell.bail("Unable to update calibration")
+
+    # The splash is laid out for the framebuffer at this rotation
+    if install_type == "console":
+        shell.info("Updating boot splash...")
+        source = splash_source()
+        splash = file_hash(source) if source else None
+        if not run_step("Boot splash", dict(inputs, splash=splash), update_splash):
+            shell.bail("Unable to install the boot splash")
+    elif splash_image:
+        print("The boot splash is only shown with console installs")
+    return True
+
+def installed_type():
+    """Return the install type recorded in the manifest
+
+    Installs from before it was recorded are guessed from the units they left behind.
+    """
+    manifest = get_manifest() or {}
+    if "install_type" in manifest:
+        return manifest["install_type"]
+    return "console" if shell.exists("/etc/systemd/system/con2fbmap.service") else "mirror"
+
+def finish(start_time, install_type):
+    """Exit early if every step was already applied, otherwise commit and report success"""
+    if not shell.planning and not changed_steps:
+        print("Everything was already applied and verified in {:.1f} seconds, nothing to do.".format(time.monotonic() - start_time))
+        shell.exit()
+    success(install_type)
+
 def get_drm_devices(connected_only=False):
-    # get all drm devices from /sys/class/drm e.g. card1-HDMI-A-1, card2-SPI-1, etc.
-    devices = []
-    for item in glob.glob("/sys/class/drm/card?-*"):
-        status = shell.read_text_file(f"{item}/status").strip()
-        if connected_only and status != "connected":
-            continue
-        modes = shell.read_text_file(f"{item}/modes").strip().splitlines()
-        # remove duplicate modes
-        modes = list(dict.fromkeys(modes))
-        info = {
-            "name": item.split("-", 1)[1],
-            "status": status,
-            "modes": modes,
-        }
-        devices.append(info)
-    return devices
+    if shell.root is not None:
+        # The image's displays are unknown until it boots
+        return []
+    # get all drm connectors e.g. HDMI-A-1, SPI-1, etc. from one inventory snapshot
+    snapshot = drm_inventory.scan()
+    if connected_only:
+        return drm_inventory.connected_connectors(snapshot)
+    return list(snapshot["connectors"].values())
 
 ####################################################### MAIN
 target_homedir = "/home/pi"
@@ -913,15 +1990,34 @@ if shell.get_raspbian_version() == "bullseye":
 
 @click.command()
 @click.option('-v', '--version', is_flag=True, callback=print_version_cb, expose_value=False, is_eager=True, help="Print version information")
+@click.option('--spi-report', is_flag=True, callback=spi_report_cb, expose_value=False, is_eager=True, help="Print the planned SPI speed and frame time for each display and rotation and exit")
+@click.option('--precompile-overlays', is_flag=True, callback=precompile_overlays_cb, expose_value=False, is_eager=True, help="Compile all overlays into the cache in parallel and exit")
 @click.option('-u', '--user', nargs=1, default=target_homedir, type=str, help="Specify path of primary user's home directory", show_default=True)
 @click.option('--display', nargs=1, default=None, help="Specify a display option (1-{}) or type {}".format(len(config), get_config_types()))
 @click.option('--rotation', nargs=1, default=None, type=int, help="Specify a rotation option (1-4) or degrees {}".format(tuple(sorted([int(x) for x in PITFT_ROTATIONS]))))
-@click.option('--install-type', nargs=1, default=None, type=click.Choice(['mirror', 'fbcp', 'console', 'uninstall']), help="Installation Type")
+@click.option('--install-type', nargs=1, default=None, type=click.Choice(['mirror', 'fbcp', 'console', 'drivers', 'uninstall']), help="Installation Type")
 @click.option('--reboot', nargs=1, default=None, type=click.Choice(['yes', 'no']), help="Specify whether to reboot after the script is finished")
 @click.option('--boot', nargs=1, default=boot_dir, type=str, help="Specify the boot directory", show_default=True)
-def main(user, display, rotation, install_type, reboot, boot):
-    global target_homedir, pitft_config, pitftrot, auto_reboot, boot_dir, is_desktop, manager, SYSTEMD
+@click.option('--trace', default=None, expose_value=False, help="Write a Chrome trace of each phase and command to this file")
+@click.option('--rotate-only', is_flag=True, help="Only regenerate the settings that depend on the rotation of an installed display")
+@click.option('--live', is_flag=True, help="Load the overlay and driver into the running system instead of rebooting, where possible")
+@click.option('--initramfs', is_flag=True, help="Load MIPI panel drivers and firmware from the initramfs so the panel shows the console from the first kernel message")
+@click.option('--splash', default=None, type=click.Path(exists=True, dir_okay=False), help="Image to show on the PiTFT from the moment it probes until the console appears (console installs)")
+@click.option('--no-splash', is_flag=True, help="Remove the boot splash installed by an earlier run")
+@click.option('--plan', is_flag=True, help="Print the commands, packages, downloads and file writes with estimated times instead of installing")
+@click.option('--apt-max-age', nargs=1, default=APT_MAX_AGE, type=int, help="Maximum age in seconds of the apt indexes before they are updated", show_default=True)
+@click.option('--root', default=None, expose_value=False, help="Install into the image mounted at this path instead of the running system")
+@click.option('--boot-mount', default=None, expose_value=False, help="Where the image's boot partition is mounted, if not under --root")
+def main(user, display, rotation, install_type, reboot, boot, rotate_only, live, initramfs, splash, no_splash, plan, apt_max_age):
+    global target_homedir, pitft_config, pitftrot, auto_reboot, boot_dir, is_desktop, manager, SYSTEMD, APT_MAX_AGE, live_mode, initramfs_mode, splash_image, drop_splash
     shell.clear()
+    start_time = time.monotonic()
+    APT_MAX_AGE = apt_max_age
+    shell.planning = plan
+    live_mode = live
+    initramfs_mode = initramfs
+    splash_image = os.path.abspath(splash) if splash else None
+    drop_splash = no_splash
     if user != target_homedir:
         target_homedir = user
         print(f"Homedir = {target_homedir}")
@@ -956,6 +2052,10 @@ Run time of up to 5 minutes. Reboot required!
         global pitft_config
         pitft_config = config
         print("Display Type: {}".format(pitft_config["menulabel"]))
+        if "mipi_data" in pitft_config:
+            mipi_data.update(pitft_config["mipi_data"])
+        if rotate_only:
+            return
         if is_kernel_upgrade_required():
             print("WARNING! WILL UPGRADE YOUR KERNEL TO LATEST")
 
@@ -1001,11 +2101,21 @@ Run time of up to 5 minutes. Reboot required!
         shell.bail("""Unfortunately {rotation} degrees for the {display} is not working at this time. Please
 restart the script and choose a different orientation.""".format(rotation=pitftrot, display=pitft_config["menulabel"]))
 
+    if install_type is None and rotate_only:
+        install_type = installed_type()
+        print(f"Updating the rotation of a {install_type} install")
     if install_type is None:
         # Show a selection menu for install_types using shell.select_n and setting the selection to the key of install_types
         install_selection = shell.select_n("Select install type:", install_types.values())
         install_type = list(install_types.keys())[install_selection - 1]
-    update_wayland_settings()
+    inputs = {"display": pitft_config["type"], "boot": boot_dir}
+    if rotate_only:
+        # Drivers and services don't depend on the rotation, options like --initramfs may need packages
+        if not softwareinstall(install_type):
+            shell.bail("Unable to install software")
+        update_rotation(inputs, install_type)
+        finish(start_time, install_type)
+    run_step("Wayland output settings", dict(inputs, home=target_homedir, manager=manager), update_wayland_settings)
     if REMOVE_KERNEL_PINNING:
         # Checking if kernel is pinned
         if shell.exists('/etc/apt/preferences.d/99-adafruit-pin-kernel'):
@@ -1016,16 +2126,21 @@ restart the script and choose a different orientation.""".format(rotation=pitftr
 
     # check init system (technique borrowed from raspi-config):
     shell.info('Checking init system...')
-    if shell.run_command("which systemctl", suppress_message=True) and shell.run_command("systemctl | grep '\-\.mount'", suppress_message=True):
+    if shell.root is not None and shell.exists("/lib/systemd/systemd"):
+      SYSTEMD = True
+      print("Found systemd in the image")
+    elif shell.run_command("which systemctl", suppress_message=True) and shell.run_command("systemctl | grep '\-\.mount'", suppress_message=True):
       SYSTEMD = True
       print("Found systemd")
-    elif os.path.isfile("/etc/init.d/cron") and not os.path.islink("/etc/init.d/cron"):
+    elif os.path.isfile(shell.path("/etc/init.d/cron")) and not os.path.islink(shell.path("/etc/init.d/cron")):
       SYSTEMD = False
       print("Found sysvinit")
     else:
       shell.bail("Unrecognised init system")
 
-    if shell.grep("boot", "/proc/mounts"):
+    if shell.root is not None:
+        print(f"Using the boot partition at {shell.path(boot_dir)}")
+    elif shell.grep("boot", "/proc/mounts"):
         print("/boot is mounted")
     else:
         print("/boot must be mounted. if you think it's not, quit here and try: sudo mount /dev/mmcblk0p1 /boot")
@@ -1037,62 +2152,20 @@ restart the script and choose a different orientation.""".format(rotation=pitftr
     if not shell.isdir(target_homedir):
         shell.bail("{} must be an existing directory (use -u /home/foo to specify)".format(target_homedir))
 
-    shell.info("System update")
-    if not sysupdate():
-        shell.bail("Unable to apt-get update")
-
     shell.info("Installing Python libraries & Software...")
-    if not softwareinstall():
+    if not softwareinstall(install_type):
         shell.bail("Unable to install software")
 
     if "overlay_src" in pitft_config and "overlay_dest" in pitft_config:
         shell.info("Installing display drivers and device tree overlay...")
-        if not install_drivers():
+        if not run_step("Display drivers", dict(inputs, kernel=" ".join(shell.releases())), install_drivers):
             shell.bail("Unable to install display drivers")
 
-    shell.info(f"Updating {boot_dir}/config.txt...")
-    use_tinydrm = install_type != "console"
-    if not update_configtxt(tinydrm_install=use_tinydrm):
-        shell.bail(f"Unable to update {boot_dir}/config.txt")
+    update_rotation(inputs, install_type)
 
-    if use_mipi_driver():
-        shell.info("Configuring early module load for SPI MIPI panel...")
-        if not install_early_modules():
-            shell.bail("Unable to write /etc/modules-load.d/pitft.conf")
-
-    if "touchscreen" in pitft_config:
-        shell.info("Updating SysFS rules for Touchscreen...")
-        if not update_udev():
-            shell.bail("Unable to update /etc/udev/rules.d")
-
-        shell.info("Updating TSLib default calibration...")
-        if not update_pointercal():
-            shell.bail("Unable to update /etc/pointercal")
-
-    # ask for console access
-    if install_type == "console":
-        shell.info("Updating console to PiTFT...")
-        if not uninstall_fbcp():
-            shell.bail("Unable to uninstall fbcp")
-        if not install_console():
-            shell.bail("Unable to configure console")
-    else:
-        shell.info("Making sure console doesn't use PiTFT")
-        if not uninstall_console():
-            shell.bail("Unable to uninstall console")
-
-        # With wayland, PiTFT shows up as an additional display rather than a mirror
-        if install_type == "mirror":
-            if is_desktop:
-                shell.info("Updating Wayland desktop settings...")
-                update_wayland_settings()
-                shell.info("Updating Desktop Touch calibration...")
-                if not update_xorg():
-                    shell.bail("Unable to update calibration")
-        else:
-            if not uninstall_fbcp():
-                shell.bail("Unable to uninstall fbcp")
-    success()
+    if not run_step("Console and desktop", dict(inputs, install_type=install_type, home=target_homedir, desktop=is_desktop, manager=manager, systemd=SYSTEMD), update_console, install_type):
+        shell.bail("Unable to configure console")
+    finish(start_time, install_type)
 
 # Main function
 if __name__ == "__main__":
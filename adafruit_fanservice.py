@@ -16,8 +16,20 @@ try:
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        root = None
+
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
 shell.group = 'ADAFRUIT'
+shell.parse_target_args()
 
 def main():
     shell.clear()
@@ -51,9 +63,11 @@ Run time < 1 minute. Reboot not required.""")
     # check init system (technique borrowed from raspi-config):
     shell.group = 'FAN'
     shell.info('Checking init system...')
-    if shell.run_command("which systemctl", suppress_message=True) and shell.run_command("systemctl | grep '\-\.mount'", suppress_message=True):
+    if shell.root is not None and shell.exists("/lib/systemd/systemd"):
+        print("Found systemd in the image, OK!")
+    elif shell.run_command("which systemctl", suppress_message=True) and shell.run_command("systemctl | grep '\-\.mount'", suppress_message=True):
         print("Found systemd, OK!")
-    elif os.path.isfile("/etc/init.d/cron") and not os.path.islink("/etc/init.d/cron"):
+    elif os.path.isfile(shell.path("/etc/init.d/cron")) and not os.path.islink(shell.path("/etc/init.d/cron")):
         shell.bail("Found sysvinit, but we require systemd")
     else:
         shell.bail("Unrecognised init system")
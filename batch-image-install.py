@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Adafruit Batch Image Installer
+
+Runs one of the installer scripts against many mounted SD card images at
+once. Each image is given as ROOT or ROOT:BOOT, where BOOT is the mount
+point of its boot partition when it is not mounted under ROOT. Every
+image gets its own installer process, run from a process pool, with the
+output written to a log file per image.
+
+Example:
+    sudo python3 batch-image-install.py --jobs 8 --image /mnt/card1/root:/mnt/card1/boot \\
+        adafruit-pitft.py --display 28r --rotation 90 --install-type console --reboot no
+"""
+
+import concurrent.futures
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import click
+except ImportError:
+    raise RuntimeError("The library 'Click' was not found. To install, try typing: pip3 install Click")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_image(image):
+    """Split ROOT[:BOOT] into the root and boot partition mounts"""
+    root, _, boot_mount = image.partition(":")
+    return root, boot_mount or None
+
+def run_installer(installer, installer_args, image, log_dir):
+    """Run the installer against one image, returning (image, exit status, seconds, log file)"""
+    root, boot_mount = parse_image(image)
+    command = [sys.executable, installer] + list(installer_args) + [f"--root={root}"]
+    if boot_mount:
+        command.append(f"--boot-mount={boot_mount}")
+    log_file = os.path.join(log_dir, root.strip(os.sep).replace(os.sep, "_") + ".log")
+    start_time = time.monotonic()
+    with open(log_file, "w", encoding="utf-8") as log:
+        result = subprocess.run(command, cwd=SCRIPT_DIR, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, check=False)
+    return image, result.returncode, time.monotonic() - start_time, log_file
+
+@click.command(context_settings=dict(ignore_unknown_options=True))
+@click.option('--image', 'images', multiple=True, help="Mounted image as ROOT or ROOT:BOOT, may be repeated")
+@click.option('--images-from', type=click.File(), default=None, help="File with one ROOT or ROOT:BOOT per line")
+@click.option('--jobs', default=os.cpu_count(), type=int, help="Number of images to process at once", show_default=True)
+@click.option('--log-dir', default="batch-logs", help="Directory for the per-image logs", show_default=True)
+@click.argument('installer')
+@click.argument('installer_args', nargs=-1, type=click.UNPROCESSED)
+def main(images, images_from, jobs, log_dir, installer, installer_args):
+    images = list(images)
+    if images_from:
+        images += [line.strip() for line in images_from if line.strip() and not line.startswith("#")]
+    if not images:
+        raise click.UsageError("No images given, use --image or --images-from")
+    if not os.path.exists(os.path.join(SCRIPT_DIR, installer)):
+        raise click.UsageError(f"Installer {installer} was not found in {SCRIPT_DIR}")
+    for image in images:
+        if not os.path.isdir(parse_image(image)[0]):
+            raise click.UsageError(f"{image} is not a mounted image root")
+    os.makedirs(log_dir, exist_ok=True)
+    log_dir = os.path.abspath(log_dir)
+
+    print(f"Running {installer} on {len(images)} images with {jobs} jobs")
+    start_time = time.monotonic()
+    failed = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_installer, installer, installer_args, image, log_dir) for image in images]
+        for future in concurrent.futures.as_completed(futures):
+            image, status, seconds, log_file = future.result()
+            print(f"{'ok' if status == 0 else 'FAILED':6} {image} in {seconds:.1f}s ({log_file})")
+            if status != 0:
+                failed.append(image)
+    elapsed = time.monotonic() - start_time
+    print(f"{len(images) - len(failed)} of {len(images)} images done in {elapsed:.1f}s, {len(images) * 3600 / elapsed:.0f} images per hour")
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Adafruit DRM and Framebuffer Inventory
+
+Reads the DRM cards and connectors, the framebuffers, their drivers and
+the SPI devices they hang off in a single pass over sysfs and returns an
+indexed snapshot. The sysfs root can be changed so fixture trees or vkms
+can be used for testing.
+"""
+
+import json
+import os
+import re
+
+try:
+    import click
+except ImportError:
+    raise RuntimeError("The library 'Click' was not found. To install, try typing: pip3 install Click")
+
+SYSFS_ROOT = "/sys"
+CARD_PATTERN = re.compile(r"^card(\d+)$")
+CONNECTOR_PATTERN = re.compile(r"^(card\d+)-(.+)$")
+FRAMEBUFFER_PATTERN = re.compile(r"^fb(\d+)$")
+SPI_DEVICE_PATTERN = re.compile(r"^spi\d+\.\d+$")
+# Framebuffers that are never the SPI panel
+NON_SPI_FRAMEBUFFERS = ("vc4drmfb", "simple-framebuffer")
+
+def read_attribute(path):
+    """Read a sysfs attribute, returning an empty string if it is missing"""
+    try:
+        with open(path, encoding="utf-8") as file:
+            return file.read().strip()
+    except OSError:
+        return ""
+
+def device_info(path, sysfs_root):
+    """Return the device path relative to the sysfs root along with its driver and SPI parent"""
+    device = os.path.realpath(os.path.join(path, "device"))
+    if not os.path.exists(device):
+        return {"device": None, "driver": None, "spi": None}
+    driver = os.path.join(device, "driver")
+    spi = next((part for part in reversed(device.split(os.sep)) if SPI_DEVICE_PATTERN.match(part)), None)
+    return {
+        "device": "/" + os.path.relpath(device, sysfs_root),
+        "driver": os.path.basename(os.path.realpath(driver)) if os.path.exists(driver) else None,
+        "spi": spi,
+    }
+
+def scan(sysfs_root=SYSFS_ROOT):
+    """Return a snapshot of the DRM cards, connectors and framebuffers
+
+    cards and connectors are keyed by name (e.g. "card1" and "HDMI-A-1") and
+    framebuffers by their number.
+    """
+    sysfs_root = os.path.realpath(sysfs_root)
+    snapshot = {"cards": {}, "connectors": {}, "framebuffers": {}}
+    drm_dir = os.path.join(sysfs_root, "class", "drm")
+    entries = sorted(os.listdir(drm_dir)) if os.path.isdir(drm_dir) else []
+    for entry in entries:
+        path = os.path.join(drm_dir, entry)
+        match = CARD_PATTERN.match(entry)
+        if match:
+            snapshot["cards"][entry] = dict(index=int(match.group(1)), **device_info(path, sysfs_root))
+            continue
+        match = CONNECTOR_PATTERN.match(entry)
+        if match:
+            snapshot["connectors"][match.group(2)] = {
+                "name": match.group(2),
+                "card": match.group(1),
+                "status": read_attribute(f"{path}/status"),
+                "enabled": read_attribute(f"{path}/enabled"),
+                # Remove duplicate modes
+                "modes": list(dict.fromkeys(read_attribute(f"{path}/modes").splitlines())),
+            }
+
+    card_by_device = {card["device"]: name for name, card in snapshot["cards"].items() if card["device"]}
+    graphics_dir = os.path.join(sysfs_root, "class", "graphics")
+    entries = os.listdir(graphics_dir) if os.path.isdir(graphics_dir) else []
+    for entry in entries:
+        match = FRAMEBUFFER_PATTERN.match(entry)
+        if not match:
+            continue
+        path = os.path.join(graphics_dir, entry)
+        info = device_info(path, sysfs_root)
+        snapshot["framebuffers"][int(match.group(1))] = dict(
+            number=int(match.group(1)),
+            name=read_attribute(f"{path}/name"),
+            virtual_size=read_attribute(f"{path}/virtual_size"),
+            bits_per_pixel=read_attribute(f"{path}/bits_per_pixel"),
+            card=card_by_device.get(info["device"]),
+            **info,
+        )
+    snapshot["framebuffers"] = dict(sorted(snapshot["framebuffers"].items()))
+
+    for connector in snapshot["connectors"].values():
+        card = snapshot["cards"].get(connector["card"], {})
+        connector["driver"] = card.get("driver")
+        connector["spi"] = card.get("spi")
+    return snapshot
+
+def connected_connectors(snapshot):
+    return [connector for connector in snapshot["connectors"].values() if connector["status"] == "connected"]
+
+def find_spi_framebuffer(snapshot, display_type=None):
+    """Return the framebuffer of the SPI panel, or None if it has not probed yet
+
+    The fbdev name contains the display type for tinydrm ("ili9341drmfb") and
+    fbtft ("fb_ili9341") drivers. panel-mipi-dbi-spi framebuffers are matched
+    by their SPI parent device instead.
+    """
+    for framebuffer in snapshot["framebuffers"].values():
+        if display_type and display_type in framebuffer["name"]:
+            return framebuffer
+    for framebuffer in snapshot["framebuffers"].values():
+        if framebuffer["spi"] and framebuffer["name"] not in NON_SPI_FRAMEBUFFERS:
+            return framebuffer
+    return None
+
+@click.group()
+@click.option('--sysfs-root', default=SYSFS_ROOT, help="Root of the sysfs tree to read", show_default=True)
+@click.pass_context
+def main(ctx, sysfs_root):
+    ctx.obj = scan(sysfs_root)
+
+@main.command("list")
+@click.pass_obj
+def list_command(snapshot):
+    """Print the snapshot as JSON"""
+    print(json.dumps(snapshot, indent=2))
+
+@main.command("spi-fb")
+@click.argument('display_type', required=False)
+@click.pass_obj
+def spi_fb_command(snapshot, display_type):
+    """Print the SPI panel framebuffer number, exiting with 1 if there is none"""
+    framebuffer = find_spi_framebuffer(snapshot, display_type)
+    if framebuffer is None:
+        raise SystemExit(1)
+    print(framebuffer["number"])
+
+@main.command("framebuffers")
+@click.pass_obj
+def framebuffers_command(snapshot):
+    """Print one line per framebuffer"""
+    for framebuffer in snapshot["framebuffers"].values():
+        print(f"  fb{framebuffer['number']}: name='{framebuffer['name']}' driver='{framebuffer['driver']}' device='{framebuffer['device']}'")
+
+if __name__ == "__main__":
+    main()
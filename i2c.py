@@ -12,8 +12,18 @@ except ImportError:
         "sudo pip3 install adafruit-python-shell"
     )
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
 shell.group = "I2C"
+shell.parse_target_args()
 
 
 def main():
@@ -2,7 +2,6 @@
 #
 # SPDX-License-Identifier: MIT
 
-import os
 import subprocess
 
 try:
@@ -11,7 +10,17 @@ try:
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
+shell.parse_target_args()
 
 BLACKLIST = "/etc/modprobe.d/raspi-blacklist.conf"
 PRODUCT_NAME = "I2S Amplifier"
@@ -64,7 +73,7 @@ def uninstall():
         shell.pattern_replace(config, "^#dtparam=audio=on", "dtparam=audio=on")
         reboot = True
 
-    if os.path.exists(BLACKLIST):
+    if shell.exists(BLACKLIST):
         print(f"Restoring Blacklist entries in {BLACKLIST}")
         # Only un-comment the exact forms the installer normalizes to, so we
         # never touch lines the user commented out themselves before install.
@@ -72,12 +81,12 @@ def uninstall():
         shell.pattern_replace(BLACKLIST, "^#blacklist snd_soc_max98357a$", "blacklist snd_soc_max98357a")
 
     print("Restoring sound configuration")
-    if os.path.exists("/etc/asound.conf.old"):
+    if shell.exists("/etc/asound.conf.old"):
         # We created /etc/asound.conf, so it's ours to remove. Restore the
         # original that the installer set aside as .old.
         shell.remove("/etc/asound.conf")
         shell.move("/etc/asound.conf.old", "/etc/asound.conf")
-    elif os.path.exists("/etc/asound.conf"):
+    elif shell.exists("/etc/asound.conf"):
         # No saved original means the installer created asound.conf from
         # scratch; remove it so ALSA falls back to its defaults.
         shell.remove("/etc/asound.conf")
@@ -122,15 +131,15 @@ def install():
     print(f"\nDisabling built-in audio in {config}")
     shell.pattern_replace(config, "^dtparam=audio=on", "#dtparam=audio=on")
 
-    if os.path.exists(BLACKLIST):
+    if shell.exists(BLACKLIST):
         print("\nCommenting out Blacklist entry in", BLACKLIST)
         shell.pattern_replace(BLACKLIST, "^blacklist[[:space:]]*snd_soc_max98357a.*", "#blacklist snd_soc_max98357a")
         shell.pattern_replace(BLACKLIST, "^blacklist[[:space:]]*snd_soc_max98357a_i2c.*", "#blacklist snd_soc_max98357a_i2c")
         shell.pattern_replace(BLACKLIST, "^blacklist[[:space:]]*snd_soc_max98357a.*", "#blacklist snd_soc_max98357a")
 
     print("Configuring sound output")
-    if os.path.exists("/etc/asound.conf"):
-        if os.path.exists("/etc/asound.conf.old"):
+    if shell.exists("/etc/asound.conf"):
+        if shell.exists("/etc/asound.conf.old"):
             shell.remove("/etc/asound.conf.old")
         shell.move("/etc/asound.conf", "/etc/asound.conf.old")
     shell.write_text_file("~/asound.conf",
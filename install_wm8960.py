@@ -9,8 +9,20 @@ try:
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        run_host_command = Shell.run_command
+
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
 shell.group = "WM8960"
+shell.parse_target_args()
 
 REPO = "https://github.com/waveshare/WM8960-Audio-HAT"
 CLONE_DIR = "WM8960-Audio-HAT"
@@ -31,12 +43,13 @@ def install_module(src):
         shell.run_command(f"dkms remove --force -m {MODULE} -v {VERSION} --all || true")
         shell.remove(f"/usr/src/{MODULE}-{VERSION}")
 
-    shell.run_command(f"mkdir -p /usr/src/{MODULE}-{VERSION}")
-    shell.run_command(f"cp -a {src}/* /usr/src/{MODULE}-{VERSION}/")
+    # The sources are copied from this machine, so this also works for images
+    shell.run_host_command(f"mkdir -p {shell.path(f'/usr/src/{MODULE}-{VERSION}')}")
+    shell.run_host_command(f"cp -a {src}/* {shell.path(f'/usr/src/{MODULE}-{VERSION}')}/")
     shell.run_command(f"dkms add -m {MODULE} -v {VERSION}")
 
     # Build/install only for kernels >= 6.5.
-    for kernel in os.listdir("/lib/modules"):
+    for kernel in os.listdir(shell.path("/lib/modules")):
         try:
             major, minor = (int(p) for p in kernel.split(".")[:2])
         except ValueError:
@@ -19,10 +19,26 @@ try:
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+        def require_running_system(self):
+            pass
+
+shell = TargetShell()
 shell.group = 'LIBGPIOD'
+shell.parse_target_args()
+# The build runs against the Python and kernel headers of the running system
+shell.require_running_system()
 
 @click.command()
+@click.option('--trace', default=None, expose_value=False, help="Write a Chrome trace of each phase and command to this file")
 @click.option('-l', '--legacy', is_flag=True, help="Install a legacy version of libgpiod for systems with older libraries")
 def main(legacy):
     print("Installing build requirements - this may take a few minutes!\n")
@@ -15,10 +15,25 @@ try:
     from adafruit_shell import Shell
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
+
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+        def require_running_system(self):
+            pass
 import os
 
-shell = Shell()
+shell = TargetShell()
 shell.group="Retrogame"
+shell.parse_target_args()
+# The downloads are unpacked and moved into place straight away, which needs the running system
+shell.require_running_system()
 
 def main():
     shell.clear()
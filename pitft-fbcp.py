@@ -9,7 +9,22 @@ try:
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: pip3 install adafruit-python-shell")
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        run_host_command = Shell.run_command
+
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+        def target_options(self):
+            return ""
+
+shell = TargetShell()
+shell.parse_target_args()
 
 # Check if adafruit-pitft.py is available, if not, we can't continue
 if not shell.exists("adafruit-pitft.py"):
@@ -182,7 +197,7 @@ TFT MADCTL rotate: {selected_tftrotate['label']}
     username = os.environ["SUDO_USER"]
 
     # We'll just call adafruit-pitft.py with the command options for future compatibility and run with sudo, but as the user
-    shell.run_command(f"sudo -E env PATH=$PATH python3 adafruit-pitft.py --display {selected_config['pitft_id']} --rotation {selected_tftrotate['value']} --install-type mirror --reboot no", run_as_user=username)
+    shell.run_host_command(f"sudo -E env PATH=$PATH python3 adafruit-pitft.py --display {selected_config['pitft_id']} --rotation {selected_tftrotate['value']} --install-type mirror --reboot no {shell.target_options()}", run_as_user=username)
 
     # PITFT SETUP ------------------------------------
     # Apply anything that is specific for the PiTFT
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Adafruit PiTFT Framebuffer Mirror
+
+Mirrors the HDMI framebuffer onto a PiTFT. Both framebuffers are memory
+mapped, the source is scaled to the panel size, compared against the
+previous frame in tiles and only the tiles that changed are converted to
+RGB565 and written to the panel. The panel driver only has to push the
+touched regions over SPI, so an idle desktop costs almost nothing.
+
+HDMI is left at its native mode. Scaling and rotation are done with a
+precomputed gather map (one source index per panel pixel) that is built
+once per source mode, panel size and rotation and cached on disk, so each
+frame costs a single vectorized gather. Cached maps are also keyed by the
+hash of this file, the architecture and the numpy version, so an updated
+mirror never reuses maps built by an older one.
+
+Framebuffers can be plain files for testing, in which case their size
+and depth have to be given on the command line.
+"""
+
+import hashlib
+import mmap
+import os
+import platform
+import time
+
+try:
+    import click
+except ImportError:
+    raise RuntimeError("The library 'Click' was not found. To install, try typing: pip3 install Click")
+try:
+    import numpy as np
+except ImportError:
+    raise RuntimeError("The library 'numpy' was not found. To install, try typing: sudo apt-get install python3-numpy")
+
+import drm_inventory
+
+CACHE_DIR = "/var/cache/adafruit-pitft/mirror"
+ROTATIONS = (0, 90, 180, 270)
+
+DTYPES = {
+    16: np.uint16,
+    32: np.uint32,
+}
+
+def read_sysfs(fb_name, attribute):
+    with open(f"/sys/class/graphics/{fb_name}/{attribute}", encoding="utf-8") as file:
+        return file.read().strip()
+
+def parse_size(value):
+    """Parse a WIDTHxHEIGHT string into a tuple of ints"""
+    if value is None:
+        return None
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+class Framebuffer:
+    """A memory mapped framebuffer device or file
+
+    Geometry that is not given is read from /sys/class/graphics.
+    """
+
+    def __init__(self, path, size=None, bpp=None, stride=None):
+        fb_name = os.path.basename(os.path.realpath(path))
+        if size is None:
+            size = tuple(int(value) for value in read_sysfs(fb_name, "virtual_size").split(","))
+        if bpp is None:
+            bpp = int(read_sysfs(fb_name, "bits_per_pixel"))
+        if bpp not in DTYPES:
+            raise ValueError(f"Unsupported framebuffer depth {bpp} for {path}")
+        if stride is None:
+            try:
+                stride = int(read_sysfs(fb_name, "stride"))
+            except OSError:
+                stride = size[0] * bpp // 8
+        self.path = path
+        self.width, self.height = size
+        self.bpp = bpp
+        self.stride = stride // (bpp // 8)
+        self._file = open(path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), stride * self.height)
+        self.flat = np.ndarray((self.height * self.stride,), dtype=DTYPES[bpp], buffer=self._mmap)
+        self.pixels = self.flat.reshape(self.height, self.stride)[:, :self.width]
+
+    def close(self):
+        self.pixels = self.flat = None
+        self._mmap.close()
+        self._file.close()
+
+def to_rgb565(pixels):
+    """Convert XRGB8888 pixels to RGB565"""
+    return (
+        ((pixels >> 8) & 0xF800) |
+        ((pixels >> 5) & 0x07E0) |
+        ((pixels >> 3) & 0x001F)
+    ).astype(np.uint16)
+
+def dirty_rectangles(previous, frame, tile):
+    """Return (x, y, width, height) rectangles covering the tiles that changed
+
+    Runs of dirty tiles in a tile row become one rectangle, and rectangles
+    with the same span in consecutive tile rows are merged.
+    """
+    height, width = frame.shape
+    tile_rows = -(-height // tile)
+    tile_cols = -(-width // tile)
+    changed = previous != frame
+    if changed.shape != (tile_rows * tile, tile_cols * tile):
+        padded = np.zeros((tile_rows * tile, tile_cols * tile), dtype=bool)
+        padded[:height, :width] = changed
+        changed = padded
+    tiles = changed.reshape(tile_rows, tile, tile_cols, tile).any(axis=(1, 3))
+    rectangles = []
+    for row in np.flatnonzero(tiles.any(axis=1)):
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], tiles[row].astype(np.int8), [0]))))
+        y = int(row) * tile
+        rect_height = min(y + tile, height) - y
+        for start, end in zip(edges[::2], edges[1::2]):
+            x = int(start) * tile
+            rect_width = min(int(end) * tile, width) - x
+            for index, (rx, ry, rw, rh) in enumerate(rectangles):
+                if rx == x and rw == rect_width and ry + rh == y:
+                    rectangles[index] = (rx, ry, rw, rh + rect_height)
+                    break
+            else:
+                rectangles.append((x, y, rect_width, rect_height))
+    return rectangles
+
+def build_gather_map(source_size, source_stride, dest_size, rotation):
+    """Return the flat source index for every destination pixel
+
+    The source is rotated clockwise by rotation degrees and then scaled to
+    the destination size with nearest neighbour sampling.
+    """
+    source_width, source_height = source_size
+    dest_width, dest_height = dest_size
+    if rotation in (90, 270):
+        rotated_width, rotated_height = source_height, source_width
+    else:
+        rotated_width, rotated_height = source_width, source_height
+    u = ((np.arange(dest_width) * rotated_width) // dest_width)[None, :]
+    v = ((np.arange(dest_height) * rotated_height) // dest_height)[:, None]
+    if rotation == 0:
+        x, y = u, v
+    elif rotation == 90:
+        x, y = v, source_height - 1 - u
+    elif rotation == 180:
+        x, y = source_width - 1 - u, source_height - 1 - v
+    elif rotation == 270:
+        x, y = source_width - 1 - v, u
+    else:
+        raise ValueError(f"Unsupported rotation {rotation}")
+    return (y * source_stride + x).astype(np.int32)
+
+def cache_key():
+    """Return a key from the hash of this file, the architecture and the numpy version"""
+    with open(os.path.abspath(__file__), "rb") as file:
+        source_hash = hashlib.sha256(file.read()).hexdigest()
+    return hashlib.sha256(f"{source_hash}\n{platform.machine()}\n{np.__version__}".encode()).hexdigest()[:16]
+
+def load_gather_map(source, dest, rotation, cache_dir=CACHE_DIR):
+    """Load the gather map for this geometry from the cache, building it if needed"""
+    name = f"{source.width}x{source.height}s{source.stride}-{dest.width}x{dest.height}-r{rotation}-{cache_key()}.npy"
+    path = os.path.join(cache_dir, name) if cache_dir else None
+    if path and os.path.exists(path):
+        print(f"Gather map cache hit ({name})")
+        return np.load(path)
+    if path:
+        print(f"Gather map cache miss ({name})")
+    gather_map = build_gather_map((source.width, source.height), source.stride, (dest.width, dest.height), rotation)
+    if path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(f"{path}.tmp.npy", gather_map)
+            os.replace(f"{path}.tmp.npy", path)
+        except OSError as error:
+            print(f"Unable to cache gather map in {cache_dir}: {error}")
+    return gather_map
+
+def auto_rotation(source, dest):
+    """Rotate by 90 degrees when only one of the framebuffers is portrait"""
+    return 90 if (source.width > source.height) != (dest.width > dest.height) else 0
+
+class Mirror:
+    """Scale the source framebuffer onto the destination, writing only dirty tiles"""
+
+    def __init__(self, source, dest, tile=16, rotation=0, cache_dir=CACHE_DIR):
+        if dest.bpp > source.bpp:
+            raise ValueError(f"Cannot mirror a {source.bpp} bit source onto a {dest.bpp} bit destination")
+        self.source = source
+        self.dest = dest
+        self.tile = tile
+        self.gather_map = load_gather_map(source, dest, rotation, cache_dir)
+        self.previous = None
+
+    def capture(self):
+        """Return the current source frame scaled, rotated and converted for the destination"""
+        frame = self.source.flat.take(self.gather_map)
+        if self.source.bpp == 32 and self.dest.bpp == 16:
+            frame = to_rgb565(frame)
+        return frame
+
+    def update(self):
+        """Copy one frame, returning the number of pixels written"""
+        frame = self.capture()
+        if self.previous is None:
+            rectangles = [(0, 0, self.dest.width, self.dest.height)]
+        else:
+            rectangles = dirty_rectangles(self.previous, frame, self.tile)
+        written = 0
+        for x, y, width, height in rectangles:
+            self.dest.pixels[y:y + height, x:x + width] = frame[y:y + height, x:x + width]
+            written += width * height
+        self.previous = frame
+        return written
+
+def find_framebuffers():
+    """Return the (source, destination) framebuffer devices
+
+    The destination is the SPI panel framebuffer, the source is the first
+    other framebuffer.
+    """
+    snapshot = drm_inventory.scan()
+    panel = drm_inventory.find_spi_framebuffer(snapshot)
+    dest = f"/dev/fb{panel['number']}" if panel else None
+    source = next((f"/dev/fb{number}" for number in snapshot["framebuffers"] if panel is None or number != panel["number"]), None)
+    return source, dest
+
+@click.command()
+@click.option('--source', default=None, help="Source framebuffer device or file (default: first non-SPI framebuffer)")
+@click.option('--dest', default=None, help="Destination framebuffer device or file (default: SPI framebuffer)")
+@click.option('--source-size', default=None, help="Source size as WIDTHxHEIGHT, required for files")
+@click.option('--source-bpp', default=None, type=click.Choice(['16', '32']), help="Source bits per pixel, required for files")
+@click.option('--dest-size', default=None, help="Destination size as WIDTHxHEIGHT, required for files")
+@click.option('--dest-bpp', default=None, type=click.Choice(['16', '32']), help="Destination bits per pixel, required for files")
+@click.option('--fps', default=60, type=int, help="Maximum frames per second", show_default=True)
+@click.option('--rotate', default=None, type=click.Choice([str(rotation) for rotation in ROTATIONS]), help="Clockwise rotation of the source (default: 90 if only one framebuffer is portrait)")
+@click.option('--cache-dir', default=CACHE_DIR, help="Directory for cached gather maps, empty to disable", show_default=True)
+@click.option('--tile', default=16, type=int, help="Tile size in pixels used to find changed regions", show_default=True)
+@click.option('--frames', default=None, type=int, help="Exit after this many frames")
+@click.option('--verbose', is_flag=True, help="Print how much of each second's frames was written")
+def main(source, dest, source_size, source_bpp, dest_size, dest_bpp, fps, rotate, cache_dir, tile, frames, verbose):
+    default_source, default_dest = find_framebuffers()
+    source = source or default_source
+    dest = dest or default_dest
+    if source is None or dest is None:
+        raise click.ClickException("Unable to find the source and destination framebuffers")
+    source_fb = Framebuffer(source, parse_size(source_size), int(source_bpp) if source_bpp else None)
+    dest_fb = Framebuffer(dest, parse_size(dest_size), int(dest_bpp) if dest_bpp else None)
+    rotation = int(rotate) if rotate is not None else auto_rotation(source_fb, dest_fb)
+    mirror = Mirror(source_fb, dest_fb, tile, rotation, cache_dir)
+    print(f"Mirroring {source} ({source_fb.width}x{source_fb.height}) to {dest} ({dest_fb.width}x{dest_fb.height}) rotated {rotation} degrees")
+
+    frame_time = 1 / fps
+    count = 0
+    report_frames = report_written = 0
+    report_time = time.monotonic() + 1
+    while frames is None or count < frames:
+        start = time.monotonic()
+        report_written += mirror.update()
+        report_frames += 1
+        count += 1
+        if verbose and start >= report_time:
+            total = dest_fb.width * dest_fb.height * report_frames
+            print(f"{report_frames} frames, {100 * report_written / total:.1f}% of pixels written")
+            report_frames = report_written = 0
+            report_time = start + 1
+        time.sleep(max(0, frame_time - (time.monotonic() - start)))
+    source_fb.close()
+    dest_fb.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Adafruit PiTFT Boot Splash
+
+Converts an image into a raw RGB565 buffer at install time, already laid
+out for the panel framebuffer at the chosen rotation, and copies it onto
+the panel at boot with a single write into the memory mapped framebuffer.
+Nothing is decoded or converted at boot.
+
+Framebuffers can be plain files for testing, in which case the splash size
+is used as their size.
+
+Example:
+    pitft_splash.py --size 240x240 --convert logo.png splash.rgb565
+    truncate -s 115200 fb.raw
+    pitft_splash.py --size 240x240 --framebuffer fb.raw splash.rgb565
+"""
+
+import mmap
+import os
+import time
+
+try:
+    import click
+except ImportError:
+    raise RuntimeError("The library 'Click' was not found. To install, try typing: pip3 install Click")
+
+import drm_inventory
+
+SPLASH_FILE = "/var/lib/adafruit-pitft/splash.rgb565"
+WAIT_SECONDS = 10
+
+def read_sysfs(fb_name, attribute):
+    with open(f"/sys/class/graphics/{fb_name}/{attribute}", encoding="utf-8") as file:
+        return file.read().strip()
+
+def parse_size(value):
+    """Parse a WIDTHxHEIGHT string into a tuple of ints"""
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def convert_image(image_path, size):
+    """Return an image as little endian RGB565 bytes, scaled to fit size with black borders"""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("The library 'Pillow' was not found. To install, try typing: sudo apt-get install python3-pil")
+    width, height = size
+    image = Image.open(image_path).convert("RGB")
+    scale = min(width / image.width, height / image.height)
+    image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+    canvas = Image.new("RGB", size)
+    canvas.paste(image, ((width - image.width) // 2, (height - image.height) // 2))
+    data = bytearray(width * height * 2)
+    for index, (red, green, blue) in enumerate(canvas.getdata()):
+        value = (red >> 3) << 11 | (green >> 2) << 5 | blue >> 3
+        data[index * 2] = value & 0xFF
+        data[index * 2 + 1] = value >> 8
+    return bytes(data)
+
+def framebuffer_geometry(path):
+    """Return the size, bits per pixel and stride of a framebuffer device"""
+    fb_name = os.path.basename(os.path.realpath(path))
+    size = tuple(int(value) for value in read_sysfs(fb_name, "virtual_size").split(","))
+    bpp = int(read_sysfs(fb_name, "bits_per_pixel"))
+    try:
+        stride = int(read_sysfs(fb_name, "stride"))
+    except OSError:
+        stride = size[0] * bpp // 8
+    return size, bpp, stride
+
+def wait_for_framebuffer(display_type, timeout=WAIT_SECONDS):
+    """Return the SPI panel framebuffer device once it has appeared, or None"""
+    deadline = time.monotonic() + timeout
+    while True:
+        framebuffer = drm_inventory.find_spi_framebuffer(drm_inventory.scan(), display_type)
+        if framebuffer is not None and os.path.exists(f"/dev/fb{framebuffer['number']}"):
+            return f"/dev/fb{framebuffer['number']}"
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(0.05)
+
+def show_splash(data, path, size, stride):
+    """Copy a raw RGB565 buffer into a memory mapped framebuffer"""
+    width, height = size
+    line = width * 2
+    with open(path, "r+b") as file, mmap.mmap(file.fileno(), stride * height) as framebuffer:
+        if stride == line:
+            framebuffer[:len(data)] = data
+        else:
+            for row in range(height):
+                framebuffer[row * stride:row * stride + line] = data[row * line:(row + 1) * line]
+
+@click.command()
+@click.argument('splash', default=SPLASH_FILE)
+@click.option('--size', required=True, help="Size of the splash as WIDTHxHEIGHT")
+@click.option('--convert', 'image', default=None, help="Convert this image into SPLASH instead of showing it")
+@click.option('--framebuffer', default=None, help="Framebuffer device or file (default: the SPI panel framebuffer)")
+@click.option('--stride', default=None, type=int, help="Bytes per line of a framebuffer file (default: width * 2)")
+@click.option('--display-type', default=None, help="Display type used to find the SPI panel framebuffer")
+def main(splash, size, image, framebuffer, stride, display_type):
+    size = parse_size(size)
+    if image:
+        data = convert_image(image, size)
+        with open(splash, "wb") as file:
+            file.write(data)
+        print(f"Wrote {size[0]}x{size[1]} RGB565 splash to {splash}")
+        return
+    start = time.monotonic()
+    with open(splash, "rb") as file:
+        data = file.read()
+    if len(data) != size[0] * size[1] * 2:
+        raise click.ClickException(f"{splash} is not a {size[0]}x{size[1]} RGB565 buffer")
+    if framebuffer is None:
+        framebuffer = wait_for_framebuffer(display_type)
+        if framebuffer is None:
+            raise click.ClickException(f"No SPI panel framebuffer appeared within {WAIT_SECONDS} seconds")
+    if os.path.isfile(framebuffer):
+        stride = stride or size[0] * 2
+    else:
+        fb_size, bpp, stride = framebuffer_geometry(framebuffer)
+        if fb_size != size or bpp != 16:
+            # Leave the panel alone rather than draw a garbled image, e.g. after a rotation change
+            print(f"{framebuffer} is {fb_size[0]}x{fb_size[1]} at {bpp} bpp, not {size[0]}x{size[1]} RGB565, skipping the splash")
+            return
+    show_splash(data, framebuffer, size, stride)
+    print(f"Splash shown on {framebuffer} in {(time.monotonic() - start) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -10,19 +10,43 @@ Written by Melissa LeBlanc-Williams for Adafruit Industries
 """
 
 import os
+import re
 
 try:
     from adafruit_shell import Shell
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        root = None
+
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
 shell.group="Blinka"
+shell.parse_target_args()
 default_python = 3
 blinka_minimum_python_version = 3.8
 
+def python_version(command):
+    """Return the version of a python command, from the interpreter it links to in an image"""
+    if shell.root is None:
+        return shell.run_command(f"{command} -c 'import platform; print(platform.python_version())'", suppress_message=True, return_output=True)
+    path = f"/usr/bin/{command}"
+    while os.path.islink(shell.path(path)):
+        path = os.path.join(os.path.dirname(path), os.readlink(shell.path(path)))
+    match = re.fullmatch(r"python(\d+\.\d+)", os.path.basename(path))
+    # The interpreter name has no patch release, which none of the checks need
+    return f"{match.group(1)}.0" if match and shell.exists(path) else ""
+
 def default_python_version(numeric=True):
-    version = shell.run_command("python -c 'import platform; print(platform.python_version())'", suppress_message=True, return_output=True)
+    version = python_version("python")
     if numeric:
         try:
             return float(version[0:version.rfind(".")])
@@ -31,7 +55,7 @@ def default_python_version(numeric=True):
     return version
 
 def get_python3_version(numeric=True):
-    version = shell.run_command("python3 -c 'import platform; print(platform.python_version())'", suppress_message=True, return_output=True)
+    version = python_version("python3")
     if numeric:
         return float(version[0:version.rfind(".")])
     return version
@@ -97,7 +121,7 @@ def install_blinka(user=False):
     pip_command = "pip3 install --upgrade"
     username = None
     if user:
-        username = os.environ["SUDO_USER"]
+        username = target_user()
     shell.run_command(f"{pip_command} adafruit-blinka", run_as_user=username)
 
 # Custom function to run additional commands for Pi 5
@@ -114,14 +138,35 @@ def check_and_install_for_pi5(pi_model, user=False):
     else:
         print(f"Detected {pi_model}, no additional fixes needed.")
 
+def target_user():
+    """Return the user to set up, which for an image is its first regular user, or None if it has none"""
+    if shell.root is None:
+        return os.environ["SUDO_USER"]
+    if not shell.exists("/etc/passwd"):
+        return None
+    for line in shell.read_text_file("/etc/passwd").splitlines():
+        fields = line.split(":")
+        if len(fields) > 2 and fields[2] == "1000":
+            return fields[0]
+    return None
+
 def check_user_groups():
     # Check if the user has the groups i2c, spi, gpio, input, and video. If the user is not in a group, then they need to be added.
-    groups = shell.run_command("groups", suppress_message=True, return_output=True).split()
+    user = target_user()
+    if user is None:
+        print("The image has no regular user yet, skipping the group setup.")
+        return
+    if shell.root is None:
+        groups = shell.run_command("groups", suppress_message=True, return_output=True).split()
+    else:
+        # Read the memberships from the image's group file
+        members = (line.split(":") for line in shell.read_text_file("/etc/group").splitlines() if line.count(":") == 3)
+        groups = [name for name, _, _, users in members if user in users.split(",")]
     required_groups = ["i2c", "spi", "gpio", "input", "video"]
     for group in required_groups:
         if group not in groups:
             print(f"Adding user to the group: {group}.")
-            shell.run_command(f"sudo usermod -aG {group} {os.environ['SUDO_USER']}")
+            shell.run_command(f"sudo usermod -aG {group} {user}")
 
 def main():
     global default_python
@@ -16,8 +16,18 @@ try:
 except ImportError:
     raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
 shell.group="SPI Reassign"
+shell.parse_target_args()
 
 allowed_gpios = (4, 5, 6, 7, 8, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27)
 spi0_default_pins = (8, 7)
@@ -92,6 +102,9 @@ def write_new_custom(ce0_pin, ce1_pin):
         shell.write_text_file(f"{boot_dir}/config.txt", overlay_command + "\n")
 
 @click.command()
+@click.option('--root', default=None, expose_value=False, help="Install into the image mounted at this path instead of the running system")
+@click.option('--boot-mount', default=None, expose_value=False, help="Where the image's boot partition is mounted, if not under --root")
+@click.option('--trace', default=None, expose_value=False, help="Write a Chrome trace of each phase and command to this file")
 @click.option('--ce0', nargs=1, default=None, help="Specify a GPIO for CE0 or 'disabled' to disable", type=str)
 @click.option('--ce1', nargs=1, default=None, help="Specify a GPIO for CE1 or 'disabled' to disable", type=str)
 @click.option('--reboot', nargs=1, default=None, type=click.Choice(['yes', 'no']), help="Specify whether to reboot after the script is finished")
@@ -17,12 +17,22 @@ Notes on modernization (2026):
     invalid udev syntax and broke the rule on the previous version.
 """
 
-import os
-
 from adafruit_shell import Shell
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        run_host_command = Shell.run_command
+
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
 shell.group = "Retrogame"
+shell.parse_target_args()
 
 RETROGAME_URL = (
     "https://raw.githubusercontent.com/adafruit/Adafruit-Retrogame/master/retrogame"
@@ -141,16 +151,17 @@ Run time <1 minute. Reboot recommended.
 
     print("Downloading, installing retrogame...", end="")
     # Download to tmpfile because the daemon might already be running.
-    if shell.run_command(f"curl -f -s -o /tmp/retrogame {RETROGAME_URL}"):
+    # The downloads run on this machine, so with --root they go straight into the image.
+    if shell.run_host_command(f"curl -f -s -o {shell.path('/tmp/retrogame')} {RETROGAME_URL}"):
         shell.move("/tmp/retrogame", "/usr/local/bin/retrogame")
-        os.chmod("/usr/local/bin/retrogame", 0o755)
+        shell.chmod("/usr/local/bin/retrogame", 0o755)
         print("OK")
     else:
         print("ERROR")
 
     print("Downloading, installing retrogame.cfg...", end="")
-    if shell.run_command(
-        f"curl -f -s -o /boot/retrogame.cfg {RETROGAME_CFG_BASE}/retrogame.cfg.{config_name}"
+    if shell.run_host_command(
+        f"curl -f -s -o {shell.path('/boot/retrogame.cfg')} {RETROGAME_CFG_BASE}/retrogame.cfg.{config_name}"
     ):
         print("OK")
     else:
@@ -15,8 +15,21 @@ except ImportError:
         "sudo pip3 install adafruit-python-shell"
     )
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        root = None
+        run_host_command = Shell.run_command
+
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+shell = TargetShell()
 shell.group = "RGB-Matrix"
+shell.parse_target_args()
 
 # hzeller/rpi-rgb-led-matrix sees lots of active development!
 # That's cool and all, BUT, to avoid tutorial breakage,
@@ -42,6 +55,9 @@ QUALITY_OPTS = (
     "Convenience (sound on, no soldering)",
 )
 
+# Virtual environment the bindings are built into when installing into an image
+IMAGE_VENV = "/opt/rgbmatrix/env"
+
 ISOLCPUS_OPTS = (
     "Do not reserve a core for driving the display",
     "Reserve a core for driving the display (recommended)",
@@ -102,11 +118,10 @@ def set_isolcpus(cmdline_file, reserve, isolcpu_token):
 def main():
     shell.require_root()
     # Fail fast with clear guidance if pip would hit PEP 668 later.
-    check_pip_environment()
+    if shell.root is None:
+        check_pip_environment()
 
     num_cores = os.cpu_count() or 1
-    # Reserve the highest-numbered core (isolcpus is 0-indexed).
-    isolcpu_token = f"isolcpus={num_cores - 1}"
 
     config = shell.get_boot_config()
     if config is None:
@@ -169,6 +184,13 @@ def main():
     print("What is thy bidding?")
     quality_mod = shell.select_n("", QUALITY_OPTS)
 
+    if shell.root is not None:
+        # The image may be for a single core Pi Zero/1, so ask
+        print("")
+        num_cores = 4 if shell.prompt("Is the image for a four core Pi (not a Pi Zero/1)?") else 1
+    # Reserve the highest-numbered core (isolcpus is 0-indexed).
+    isolcpu_token = f"isolcpus={num_cores - 1}"
+
     # Default: don't reserve a core (e.g. single-core Pi where the menu is
     # skipped). select_n() returns 1 = "Do not reserve", 2 = "Reserve".
     isol_cpu = 1
@@ -211,20 +233,28 @@ def main():
     # Cython bindings; cmake is required by scikit-build-core (the upstream
     # build backend); unzip extracts the downloaded source archive.
     shell.run_command(
-        "apt-get install -y build-essential python3-dev python3-pip "
+        "apt-get install -y build-essential python3-dev python3-pip python3-venv "
         "python3-pillow cython3 python3-setuptools cmake unzip"
     )
 
     print("Downloading RGB matrix software...")
+    python = sys.executable
+    if shell.root is not None:
+        # Download into the image now and build the bindings on its first boot
+        os.makedirs(shell.path("/usr/local/src"), exist_ok=True)
+        shell.chdir("/usr/local/src")
+        # Keep the image's Debian pip untouched, like the venv flow on a running system
+        shell.run_command(f"python3 -m venv --system-site-packages {IMAGE_VENV}")
+        python = f"{IMAGE_VENV}/bin/python3"
     # -f makes curl fail (non-zero) on HTTP errors instead of saving a 404
     # HTML page that would later cause a confusing unzip failure.
-    shell.run_command(
+    shell.run_host_command(
         f"curl -fL {GITUSER}/{REPO}/archive/{COMMIT}.zip -o {REPO}-{COMMIT}.zip"
     )
-    shell.run_command(f"unzip -q {REPO}-{COMMIT}.zip")
+    shell.run_host_command(f"unzip -q {REPO}-{COMMIT}.zip")
     shell.remove(f"{REPO}-{COMMIT}.zip")
     shell.remove("rpi-rgb-led-matrix")
-    shell.run_command(f"mv {REPO}-{COMMIT} rpi-rgb-led-matrix")
+    shell.run_host_command(f"mv {REPO}-{COMMIT} rpi-rgb-led-matrix")
 
     print("Building and installing RGB matrix Python bindings...")
     shell.chdir("rpi-rgb-led-matrix")
@@ -232,16 +262,16 @@ def main():
     # with `pip install .` (the old `make build-python` target is gone).
     # Install into the same Python environment the installer is running in so
     # `from rgbmatrix import RGBMatrix` works for the user's project.
-    shell.run_command(f'"{sys.executable}" -m pip install --upgrade pip')
-    shell.run_command(f'"{sys.executable}" -m pip install .')
+    shell.run_command(f'"{python}" -m pip install --upgrade pip')
+    shell.run_command(f'"{python}" -m pip install .')
 
     # Change ownership to the user who called sudo, using their actual primary
     # group (which isn't always the same name as the username).
     sudo_user = os.environ.get("SUDO_USER")
-    if sudo_user:
+    if sudo_user and shell.root is None:
         sudo_gid = os.environ.get("SUDO_GID", "")
         owner = f"{sudo_user}:{sudo_gid}" if sudo_gid else sudo_user
-        shell.run_command(f"chown -R {owner} {os.getcwd()}")
+        shell.run_command(f"chown -R {owner} .")
 
     # CONFIG ---------------------------------------------------------------
 
@@ -287,7 +317,7 @@ def main():
     print("Done.")
     print("")
     print("The 'rgbmatrix' Python package is installed for this interpreter:")
-    print(f"  {sys.executable}")
+    print(f"  {python}")
     print("Run your programs with that interpreter so 'import rgbmatrix' works.")
     print("")
     print("Use this LED GPIO mapping for your board/quality choice:")
@@ -14,8 +14,23 @@ except ImportError:
         "The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell"
     )
 
-shell = Shell()
+try:
+    from target_root import TargetShell
+except ImportError:
+    # Downloaded on its own, so only the running system can be installed to
+    class TargetShell(Shell):
+        def parse_target_args(self):
+            if any(arg.startswith(("--root", "--boot-mount")) for arg in self.args[1:]):
+                self.bail("Installing into an image with --root needs target_root.py next to this script")
+
+        def require_running_system(self):
+            pass
+
+shell = TargetShell()
 shell.group = "SPECTRO"
+shell.parse_target_args()
+# The RGB matrix check and the Spectro download need the running system
+shell.require_running_system()
 
 MATRIX_WIDTHS = (64, 32)
 MATRIX_HEIGHTS = (32, 16)
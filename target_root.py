@@ -0,0 +1,554 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Adafruit Installer Target Root
+
+A Shell that can install into a mounted SD card image instead of the
+running system. With a root set, every absolute path handed to the file
+helpers is resolved inside the image (and the boot partition's files
+inside its mount when one is given), systemd units are enabled
+offline, and commands that can only run on the target itself such as apt
+or raspi-config are collected into a script that runs once on first boot.
+Commands that only look at the running system, such as which or lsmod,
+are never deferred and find nothing in an image, while grep reads the
+file from the image.
+
+Without a root it behaves exactly like Shell.
+
+The shell also keeps a history of how long each kind of command took on
+this machine. In planning mode nothing is changed: commands and file
+writes are collected into an ordered plan with cost estimates from that
+history, which print_plan() shows. Otherwise every file it writes,
+edits or removes is listed in written, and the content it had before it
+was first touched is kept in originals, so installers can fingerprint
+what they applied and undo it.
+
+With --trace PATH every phase (the span from one shell.info() message to
+the next) and every command is written to PATH as a Chrome trace event
+file, with wall time, CPU time, bytes written and whether commands
+succeeded. It can be loaded into chrome://tracing or ui.perfetto.dev.
+"""
+
+import atexit
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+try:
+    from adafruit_shell import Shell
+except ImportError:
+    raise RuntimeError("The library 'adafruit_shell' was not found. To install, try typing: sudo pip3 install adafruit-python-shell")
+
+# Where the boot partition is mounted on Bookworm and later, and before that
+BOOT_PREFIXES = ("/boot/firmware", "/boot")
+# Host side caches are shared between images and are never redirected
+HOST_PATHS = ("/var/cache/adafruit-pitft", "/var/cache/adafruit-installer")
+TIMINGS_FILE = "/var/cache/adafruit-installer/timings.json"
+# Rough costs in seconds, used until a kind of command has been timed here
+DEFAULT_COSTS = {
+    "apt-get update": 30,
+    "apt-get upgrade": 300,
+    "apt-get install": 60,
+    "apt-get remove": 20,
+    "pip install": 60,
+    "make": 120,
+    "dkms build": 300,
+    "raspi-config": 5,
+    "curl": 10,
+    "wget": 10,
+    "git clone": 20,
+    "write": 0.01,
+}
+DEFAULT_COST = 1
+PACKAGE_COMMANDS = ("apt-get install", "apt install", "pip install")
+DOWNLOAD_COMMANDS = ("apt-get update", "apt-get upgrade", "apt update", "apt upgrade", "curl", "wget", "git clone")
+# Steps estimated to take longer than this are flagged in the plan
+SLOW_STEP = 30
+FIRSTBOOT_DIR = "/var/lib/adafruit-installer"
+FIRSTBOOT_SCRIPT = f"{FIRSTBOOT_DIR}/firstboot.sh"
+FIRSTBOOT_SERVICE = "/etc/systemd/system/adafruit-firstboot.service"
+FIRSTBOOT_WANTS = "/etc/systemd/system/multi-user.target.wants/adafruit-firstboot.service"
+TARGET_OPTIONS = ("root", "boot-mount", "trace")
+# systemctl verbs that work against an offline root with --root
+OFFLINE_SYSTEMCTL = ("enable", "disable", "is-enabled", "mask", "unmask", "preset")
+# The kernel flavour each kernel= image in config.txt boots
+KERNEL_IMAGES = {"kernel.img": "v6", "kernel7.img": "v7", "kernel7l.img": "v7l", "kernel8.img": "v8", "kernel_2712.img": "2712"}
+# Commands that only look at the running system. They are never deferred or
+# planned, and with a root set they find nothing because the image isn't running
+QUERY_COMMANDS = ("which", "grep", "lsmod", "groups", "mktemp", "dpkg-query", "pip freeze", "pip list", "pip show")
+
+FIRSTBOOT_SERVICE_CONTENT = f"""[Unit]
+Description=Finish Adafruit installer steps deferred from image preparation
+Wants=network-online.target
+After=network-online.target
+ConditionPathExists={FIRSTBOOT_SCRIPT}
+
+[Service]
+Type=oneshot
+ExecStart=/bin/sh -c '/bin/sh -ex {FIRSTBOOT_SCRIPT} && mv {FIRSTBOOT_SCRIPT} {FIRSTBOOT_SCRIPT}.done && systemctl --no-block reboot'
+StandardOutput=journal+console
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+def command_key(cmd):
+    """Return the program and subcommand a command's timings are grouped under"""
+    words = [word for word in cmd.split() if word not in ("sudo", "env") and not word.startswith("-") and "=" not in word]
+    if not words:
+        return ""
+    program = os.path.basename(words[0].strip('"'))
+    if program.startswith("python") and words[1:2] == ["pip"]:
+        words = words[1:]
+        program = "pip"
+    if program in ("apt-get", "apt", "git", "dkms", "pip", "pip3") and len(words) > 1:
+        return f"{program.rstrip('3')} {words[1]}"
+    return program
+
+def is_query(cmd):
+    """Return whether any stage of a pipeline only looks at the system"""
+    return any(command_key(stage) in QUERY_COMMANDS for stage in cmd.split("|"))
+
+def kernel_flavour(release):
+    """Return the Raspberry Pi kernel flavour of a release, such as v8 or 2712, or None"""
+    match = re.search(r"[-+](?:rpt-rpi-)?(v6|v7l?|v8|2712)(-16k)?\+?$", release)
+    if match:
+        return "2712" if match.group(2) else match.group(1)
+    # Releases from before the flavour suffixes, such as 6.1.21+, are the ARMv6 kernel
+    return "v6" if release.endswith("+") else None
+
+def step_kind(cmd):
+    key = command_key(cmd)
+    if key in PACKAGE_COMMANDS:
+        return "packages"
+    if key in DOWNLOAD_COMMANDS:
+        return "download"
+    return "command"
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(round(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+class TargetShell(Shell):
+    """Shell that redirects file operations into a mounted image when a root is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.root = None
+        self.boot_mount = None
+        self.deferred = []
+        self.planning = False
+        self.plan = []
+        self.written = []
+        self.originals = {}
+        self.timings = None
+        self.timings_changed = False
+        self.trace_path = None
+        self.trace_events = []
+        self.trace_start = None
+        self.phase = None
+        atexit.register(self.save_timings)
+
+    def set_root(self, root, boot_mount=None):
+        """Install into the image mounted at root, with an optional separate boot partition mount"""
+        if not root:
+            return
+        if not os.path.isdir(root):
+            self.bail(f"Target root {root} is not a directory")
+        if boot_mount is not None and not os.path.isdir(boot_mount):
+            self.bail(f"Boot partition mount {boot_mount} is not a directory")
+        self.root = os.path.realpath(root)
+        self.boot_mount = os.path.realpath(boot_mount) if boot_mount else None
+        self.info(f"Installing into {self.root}" + (f" with the boot partition at {self.boot_mount}" if self.boot_mount else ""))
+        atexit.register(self.write_firstboot)
+
+    @staticmethod
+    def split_target_args(argv):
+        """Split --root and --boot-mount out of an argument list"""
+        values = {}
+        remaining = []
+        args = iter(argv)
+        for arg in args:
+            name = next((name for name in TARGET_OPTIONS if arg == f"--{name}" or arg.startswith(f"--{name}=")), None)
+            if name is None:
+                remaining.append(arg)
+            elif "=" in arg:
+                values[name] = arg.split("=", 1)[1]
+            else:
+                values[name] = next(args, None)
+        return values, remaining
+
+    def parse_target_args(self):
+        """Set the root from --root and --boot-mount, which every installer accepts"""
+        values, _ = self.split_target_args(sys.argv[1:])
+        self.set_root(values.get("root"), values.get("boot-mount"))
+        if values.get("trace"):
+            self.start_trace(values["trace"])
+
+    @property
+    def args(self):
+        """The supplied arguments without the target options"""
+        return sys.argv[:1] + self.split_target_args(sys.argv[1:])[1]
+
+    def target_options(self):
+        """Return the target options to pass on to another installer"""
+        if self.root is None:
+            return ""
+        return f"--root={self.root}" + (f" --boot-mount={self.boot_mount}" if self.boot_mount else "")
+
+    def run_host_command(self, cmd, suppress_message=False, return_output=False, run_as_user=None):
+        """Run a command on this machine even when a root is set, recording how long it took"""
+        start = self.usage()
+        result = super().run_command(cmd, suppress_message=suppress_message, return_output=return_output, run_as_user=run_as_user)
+        if not return_output:
+            self.record_timing(cmd, time.monotonic() - start[0])
+        if self.trace_path:
+            self.trace_event(" ".join(cmd.split()), "command", start, {} if return_output else {"succeeded": bool(result)})
+        return result
+
+    @staticmethod
+    def usage():
+        """Return the wall time, CPU time and bytes written so far by this process and its children"""
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+        return time.monotonic(), cpu_time, (own.ru_oublock + children.ru_oublock) * 512
+
+    def start_trace(self, path):
+        """Record phases and commands to a Chrome trace event file written at exit"""
+        self.trace_path = os.path.abspath(path)
+        self.trace_start = time.monotonic()
+        self.trace_events = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": os.path.basename(sys.argv[0])}}]
+        atexit.register(self.write_trace)
+
+    def trace_event(self, name, category, start, args=None):
+        end = self.usage()
+        self.trace_events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "pid": os.getpid(),
+            "tid": os.getpid(),
+            "ts": round((start[0] - self.trace_start) * 1e6),
+            "dur": round((end[0] - start[0]) * 1e6),
+            "args": dict(cpu_seconds=round(end[1] - start[1], 3), bytes_written=end[2] - start[2], **(args or {})),
+        })
+
+    def end_phase(self):
+        if self.phase is not None:
+            self.trace_event(*self.phase)
+            self.phase = None
+
+    def info(self, message, **kwargs):
+        """Print an info message, which also starts a new phase when tracing"""
+        super().info(message, **kwargs)
+        if self.trace_path:
+            self.end_phase()
+            self.phase = (message.strip(), "phase", self.usage())
+
+    def write_trace(self):
+        self.end_phase()
+        try:
+            with open("/proc/device-tree/model", encoding="utf-8") as file:
+                model = file.read().strip("\x00\n")
+        except OSError:
+            model = platform.machine()
+        trace = {
+            "traceEvents": self.trace_events,
+            "displayTimeUnit": "ms",
+            "otherData": {"script": os.path.basename(sys.argv[0]), "model": model, "kernel": platform.release(), "root": self.root or "/"},
+        }
+        with open(self.trace_path, "w", encoding="utf-8") as file:
+            json.dump(trace, file, indent=1)
+        print(f"Wrote timing trace to {self.trace_path}")
+
+    def load_timings(self):
+        if self.timings is None:
+            try:
+                with open(TIMINGS_FILE, encoding="utf-8") as file:
+                    self.timings = json.load(file)
+            except (OSError, ValueError):
+                self.timings = {}
+        return self.timings
+
+    def record_timing(self, cmd, seconds):
+        """Add a sample to the running averages for the command and its kind"""
+        timings = self.load_timings()
+        for key in {" ".join(cmd.split()), command_key(cmd)}:
+            mean, count = timings.get(key, (0, 0))
+            timings[key] = ((mean * count + seconds) / (count + 1), count + 1)
+        self.timings_changed = True
+
+    def save_timings(self):
+        if not self.timings_changed or self.planning:
+            return
+        try:
+            os.makedirs(os.path.dirname(TIMINGS_FILE), exist_ok=True)
+            with open(f"{TIMINGS_FILE}.{os.getpid()}.tmp", "w", encoding="utf-8") as file:
+                json.dump(self.timings, file, indent=1, sort_keys=True)
+            os.replace(f"{TIMINGS_FILE}.{os.getpid()}.tmp", TIMINGS_FILE)
+        except OSError:
+            pass
+        self.timings_changed = False
+
+    def estimate(self, cmd):
+        """Return the estimated seconds for a command and whether it comes from recorded timings"""
+        timings = self.load_timings()
+        for key in (" ".join(cmd.split()), command_key(cmd)):
+            if key in timings:
+                return timings[key][0], True
+        return DEFAULT_COSTS.get(command_key(cmd), DEFAULT_COST), False
+
+    def planned(self, kind, detail):
+        """Add a step to the plan when planning, returning True if it must not be carried out"""
+        if not self.planning:
+            return False
+        seconds, measured = self.estimate(detail if kind != "write" else "write")
+        self.plan.append((kind, detail, seconds, measured))
+        return True
+
+    def print_plan(self):
+        """Print the planned steps with their estimated costs"""
+        total = sum(seconds for _, _, seconds, _ in self.plan)
+        print(f"\nExecution plan: {len(self.plan)} steps, about {format_seconds(total)}")
+        for index, (kind, detail, seconds, measured) in enumerate(self.plan, 1):
+            flags = ("" if measured or kind == "write" else " (default estimate)") + (" SLOW" if seconds >= SLOW_STEP else "")
+            print(f"{index:4}. {kind:9} {format_seconds(seconds):>7}  {detail}{flags}")
+        for kind in ("packages", "download", "command", "write"):
+            steps = [seconds for step, _, seconds, _ in self.plan if step == kind]
+            if steps:
+                print(f"      {kind:9} {len(steps):3} steps, {format_seconds(sum(steps))}")
+
+    def in_target(self, path):
+        return any(path == base or path.startswith(base + os.sep) for base in (self.root, self.boot_mount) if base)
+
+    def path(self, file_path):
+        """Return the host path for a path on the target"""
+        file_path = os.path.expanduser(file_path)
+        if self.root is None or not os.path.isabs(file_path) or self.in_target(file_path):
+            return file_path
+        if any(file_path == base or file_path.startswith(base + os.sep) for base in HOST_PATHS):
+            return file_path
+        prefix = self.boot_prefix()
+        if prefix and (file_path == prefix or file_path.startswith(prefix + os.sep)):
+            return self.boot_mount + file_path[len(prefix):]
+        return self.root + file_path
+
+    def boot_prefix(self):
+        """Return where the boot partition is mounted on the target, or None without a boot partition mount"""
+        if self.boot_mount is None:
+            return None
+        # Since Bookworm /boot is on the root partition and holds the initramfs
+        return BOOT_PREFIXES[0] if os.path.isdir(self.root + BOOT_PREFIXES[0]) else BOOT_PREFIXES[1]
+
+    def popd(self):
+        # The stack holds host paths, which must not be redirected again
+        if self.root is None or not self._dirstack:
+            super().popd()
+            return
+        os.chdir(self._dirstack.pop())
+
+    def target_path(self, host_path):
+        """Return the path on the target for a host path inside the image"""
+        if self.root is None:
+            return host_path
+        host_path = os.path.realpath(host_path)
+        if self.boot_mount and (host_path == self.boot_mount or host_path.startswith(self.boot_mount + os.sep)):
+            return self.boot_prefix() + host_path[len(self.boot_mount):]
+        return host_path[len(self.root):] or "/"
+
+    def defer(self, cmd):
+        """Queue a command to run on the target's first boot"""
+        if self.in_target(os.getcwd()):
+            cmd = f"cd {self.target_path(os.getcwd())} && {cmd}"
+        print(f"Deferring until first boot: {cmd}")
+        self.deferred.append(cmd)
+
+    def run_command(self, cmd, suppress_message=False, return_output=False, run_as_user=None):
+        """Run a command, or enable units offline and defer everything else when a root is set"""
+        query = return_output or is_query(cmd)
+        if not query and self.planned(step_kind(cmd), cmd):
+            return True
+        if self.root is None:
+            return self.run_host_command(cmd, suppress_message, return_output, run_as_user)
+        if is_query(cmd):
+            return "" if return_output else False
+        words = cmd.split()
+        if words[:1] == ["sudo"]:
+            words = words[1:]
+        if words[:1] == ["systemctl"] and len(words) > 1:
+            if words[1] in OFFLINE_SYSTEMCTL and shutil.which("systemctl"):
+                offline = ["systemctl", f"--root={self.root}"] + words[1:]
+                result = subprocess.run(offline, capture_output=True, text=True, check=False)
+                return result.stdout if return_output else result.returncode == 0
+            if words[1] not in OFFLINE_SYSTEMCTL:
+                # Starting, stopping and reloading only matter on a running system
+                return "" if return_output else True
+        if return_output:
+            # Queries about the running system have no answer for an image
+            return ""
+        self.defer(cmd)
+        return True
+
+    def grep(self, search_term, location):
+        # Reading a file is answered on this machine, from the image when a root is set
+        return self.run_host_command(f"grep {search_term} {self.path(location)}", suppress_message=True)
+
+    def require_running_system(self):
+        """Bail when a root is set, for installers that can only run on the target itself"""
+        if self.root is not None:
+            self.bail(f"{os.path.basename(sys.argv[0])} has to run on the Raspberry Pi itself and can't install into an image with --root")
+
+    def record_write(self, path):
+        """Add a file that is about to be written, edited or removed to the written list"""
+        host_path = self.path(path)
+        if any(host_path.startswith(base + os.sep) for base in HOST_PATHS):
+            return
+        self.written.append(host_path)
+        if host_path not in self.originals and not os.path.isdir(host_path):
+            if os.path.exists(host_path):
+                with open(host_path, "rb") as file:
+                    self.originals[host_path] = file.read()
+            else:
+                self.originals[host_path] = None
+
+    def destination(self, source, destination):
+        """Return the file a copy or move of source to destination ends up at"""
+        if not os.path.isdir(self.path(source)) and os.path.isdir(self.path(destination)):
+            return os.path.join(destination, os.path.basename(source))
+        return destination
+
+    def write_text_file(self, path, content, append=True):
+        if not self.planned("write", self.path(path)):
+            self.record_write(path)
+            super().write_text_file(path, content, append)
+
+    def pattern_replace(self, location, pattern, replace="", multi_line=False):
+        if not self.pattern_search(location, pattern, multi_line):
+            return
+        if not self.planned("write", self.path(location)):
+            self.record_write(location)
+            super().pattern_replace(location, pattern, replace, multi_line)
+
+    def copy(self, source, destination):
+        if not self.planned("write", self.path(destination)):
+            self.record_write(self.destination(source, destination))
+            super().copy(source, destination)
+
+    def move(self, source, destination):
+        if not self.planned("write", self.path(destination)):
+            self.record_write(source)
+            self.record_write(self.destination(source, destination))
+            super().move(source, destination)
+
+    def remove(self, location):
+        if not self.exists(location):
+            return
+        if not self.planned("write", f"remove {self.path(location)}"):
+            self.record_write(location)
+            super().remove(location)
+
+    def chmod(self, location, mode):
+        if not self.planning:
+            super().chmod(location, mode)
+
+    def chown(self, location, user, group=None, recursive=False):
+        if not self.planning:
+            super().chown(location, user, group, recursive)
+
+    def write_firstboot(self):
+        """Append the deferred commands to the first boot script and enable its unit"""
+        if self.root is None or not self.deferred or self.planning:
+            return
+        script = self.path(FIRSTBOOT_SCRIPT)
+        os.makedirs(os.path.dirname(script), exist_ok=True)
+        header = "" if os.path.exists(script) else "#!/bin/sh\n# Commands deferred by the Adafruit installers until the first boot\n"
+        with open(script, "a", encoding="utf-8") as file:
+            file.write(header + "".join(f"{cmd}\n" for cmd in self.deferred))
+        os.chmod(script, 0o755)
+        wants = self.path(FIRSTBOOT_WANTS)
+        os.makedirs(os.path.dirname(wants), exist_ok=True)
+        self.write_text_file(FIRSTBOOT_SERVICE, FIRSTBOOT_SERVICE_CONTENT, append=False)
+        if not os.path.lexists(wants):
+            os.symlink(FIRSTBOOT_SERVICE, wants)
+        print(f"{len(self.deferred)} commands will run on first boot from {FIRSTBOOT_SCRIPT}")
+        self.deferred = []
+
+    def get_os(self):
+        if self.root is None:
+            return super().get_os()
+        release = self.read_text_file("/etc/os-release") if self.exists("/etc/os-release") else ""
+        if self.exists("/etc/rpi-issue") or "Raspbian" in release:
+            return "Raspbian"
+        return next((name for name in ("Debian", "Ubuntu", "Kali") if name in release), None)
+
+    def get_raspbian_version(self):
+        if self.root is None:
+            return super().get_raspbian_version()
+        if self.get_os() != "Raspbian":
+            return None
+        release = self.read_text_file("/etc/os-release") if self.exists("/etc/os-release") else ""
+        return next((line.split("=", 1)[1].strip('"') for line in release.splitlines() if line.startswith("VERSION_CODENAME=")), None)
+
+    def is_raspberry_pi(self):
+        # Images are prepared on other machines for Raspberry Pi boards
+        return self.root is not None or super().is_raspberry_pi()
+
+    def is_pi5_or_newer(self):
+        return self.root is None and super().is_pi5_or_newer()
+
+    def is_kernel_userspace_mismatched(self):
+        return self.root is None and super().is_kernel_userspace_mismatched()
+
+    def get_architecture(self):
+        if self.root is None:
+            return super().get_architecture()
+        return "aarch64" if self.exists("/lib/ld-linux-aarch64.so.1") else "armv7l"
+
+    def releases(self):
+        """Return every kernel release installed in the image, or the running one without a root"""
+        if self.root is None:
+            return [platform.release()]
+        modules = self.path("/lib/modules")
+        if not os.path.isdir(modules):
+            return []
+        # Oldest first by version number, so 6.10 sorts after 6.6
+        return sorted(os.listdir(modules), key=lambda release: ([int(part) for part in re.findall(r"\d+", re.split(r"[-+]", release)[0])], release))
+
+    def release(self):
+        """Return the kernel release the target boots
+
+        In an image that is the flavour config.txt selects with kernel=. Otherwise the
+        firmware picks one for the board, which isn't known here, so callers that
+        install something per kernel should use releases().
+        """
+        if self.root is None:
+            return platform.release()
+        releases = self.releases()
+        if not releases:
+            return platform.release()
+        config = self.get_boot_config()
+        lines = self.read_text_file(config).splitlines() if config else []
+        images = [line.split("=", 1)[1].strip() for line in lines if line.strip().startswith("kernel=")]
+        flavour = KERNEL_IMAGES.get(images[-1]) if images else None
+        booted = [release for release in releases if kernel_flavour(release) == flavour]
+        return (booted or releases)[-1]
+
+    def reboot(self):
+        if self.root is None:
+            super().reboot()
+
+    def prompt_reboot(self, default="y", **kwargs):
+        if self.root is None:
+            super().prompt_reboot(default, **kwargs)
+            return
+        print("Settings will take effect when the image is booted.")
+        self.exit()
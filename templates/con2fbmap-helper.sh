@@ -11,7 +11,13 @@
 # DRM minor / framebuffer numbers. The SPI display can land on either
 # /dev/fb0 or /dev/fb1 depending on probe order. Greping dmesg for a
 # fixed fb number is brittle (issue #365), so we discover the SPI TFT
-# framebuffer by walking /sys/class/graphics/fb*.
+# framebuffer the same way drm_inventory.py does: the fbdev name is matched
+# against the display type, falling back to any framebuffer on an SPI
+# device. The match only uses bash builtins, so a scan forks nothing.
+#
+# Rather than rescanning on a timer, which competes with the SPI panel probe on single-core Pis, we rescan only
+# when udev reports a graphics device event. Polling is kept as a
+# fallback for systems without udevadm.
 #
 # After remapping, we force a console refresh so whatever was last
 # drawn on the old framebuffer gets re-rendered on the SPI display.
@@ -19,91 +25,99 @@
 set -u
 
 DISPLAY_TYPE="{display_type}"
-TIMEOUT_DECISECONDS=300   # 30 seconds (loop sleeps 0.1s)
+TIMEOUT_SECONDS=30
+CONSOLE_FONT="{console_font}"
+# Estimated at install time, how long the setupcon fallback takes
+SETUPCON_MS={setupcon_ms}
+INVENTORY=/usr/local/bin/drm_inventory.py
 
 echo "Waiting for SPI TFT framebuffer (display_type=${DISPLAY_TYPE})..."
 
-# Return 0 (and echo the fb number) if /sys/class/graphics/$1 looks
-# like the SPI TFT we installed for.
-is_spi_tft_fb() {
-    local fbpath="$1"
-    local fbname
-    local devpath
-
-    # Read the framebuffer driver name, e.g. "ili9341drmfb", "hx8357drmfb",
-    # "mipi_dbi", "vc4drmfb", "simple-framebuffer".
-    fbname="$(cat "${fbpath}/name" 2>/dev/null || true)"
-
-    # Resolve the underlying device path (DRM card → parent device).
-    devpath="$(readlink -f "${fbpath}/device" 2>/dev/null || true)"
-
-    # 1) Name-based match. Works for ili9341, hx8357d, st7789, etc. The
-    #    fbdev name varies by driver: DRM tinydrm uses "<name>drmfb"
-    #    (e.g. "ili9341drmfb"); the older fbtft staging driver uses
-    #    "fb_<name>" (e.g. "fb_ili9341"). Accept either.
-    if [ -n "${fbname}" ]; then
-        if [[ "${fbname}" == *"${DISPLAY_TYPE}"* ]]; then
-            return 0
-        fi
-    fi
-
-    # 2) Device-path match. For panel-mipi-dbi-spi the fbdev name is
-    #    "panel-mipi-dbid" / "mipi_dbi" which does not contain the
-    #    configured display_type, but the device path under sysfs lives
-    #    below the SPI controller (e.g. .../soc/.../spi@.../spi0.0
-    #    or .../soc/.../spi@.../spi0.0/...). Match any SPI slave on
-    #    spi0.0, which is where the installer wires SPI TFT panels.
-    #    Accept both the bare leaf path (.../spi0.0) and any child path
-    #    (.../spi0.0/...); earlier versions required a trailing slash
-    #    and missed the leaf case used by panel-mipi-dbi-spi.
-    if [ -n "${devpath}" ] && \
-       { [[ "${devpath}" == *"/spi0.0" ]] || [[ "${devpath}" == *"/spi0.0/"* ]]; }; then
-        # Belt-and-braces: exclude framebuffers that are obviously not
-        # the SPI TFT (e.g. vc4drmfb, simple-framebuffer). Those should
-        # not have spi0.0 in their devpath, but guard anyway.
-        if [[ "${fbname}" != "vc4drmfb" && "${fbname}" != "simple-framebuffer" ]]; then
-            return 0
-        fi
-    fi
-
-    return 1
-}
-
-found_fb=""
-
-for ((i = 1; i <= TIMEOUT_DECISECONDS; i++)); do
+# Check the current framebuffers once. Sets found_fb on a match.
+scan_framebuffers() {
+    local fbpath fbnum fbname spi_fb=""
     for fbpath in /sys/class/graphics/fb*; do
-        [ -e "${fbpath}" ] || continue
         fbnum="${fbpath##*/fb}"
         # Only accept numeric fb entries (skip e.g. /sys/class/graphics/fbcon).
         case "${fbnum}" in
             ''|*[!0-9]*) continue ;;
         esac
         [ -e "/dev/fb${fbnum}" ] || continue
-
-        if is_spi_tft_fb "${fbpath}"; then
+        fbname=""
+        read -r fbname < "${fbpath}/name" 2>/dev/null || true
+        # tinydrm names its fbdev "<name>drmfb", fbtft "fb_<name>"
+        if [[ -n "${DISPLAY_TYPE}" && "${fbname}" == *"${DISPLAY_TYPE}"* ]]; then
             found_fb="${fbnum}"
-            break 2
+            return 0
         fi
+        # panel-mipi-dbi-spi is matched by its SPI parent device instead,
+        # cd -P resolves the device link without forking readlink
+        if [ -z "${spi_fb}" ] && [[ "${fbname}" != "vc4drmfb" && "${fbname}" != "simple-framebuffer" ]] &&
+                cd -P "${fbpath}/device" 2>/dev/null; then
+            [[ "${PWD}/" =~ /spi[0-9]+\.[0-9]+/ ]] && spi_fb="${fbnum}"
+            cd /
+        fi
+    done
+    [ -n "${spi_fb}" ] || return 1
+    found_fb="${spi_fb}"
+}
+
+# Fallback when udev events are unavailable.
+poll_framebuffers() {
+    while (( SECONDS < deadline )); do
+        scan_framebuffers && return 0
+        sleep 0.1
     done
-    sleep 0.1
-done
+    return 1
+}
+
+found_fb=""
+deadline=$((SECONDS + TIMEOUT_SECONDS))
+
+if command -v udevadm >/dev/null 2>&1; then
+    # Start listening before the initial scan so a framebuffer that
+    # appears in between is not missed.
+    exec {events_fd}< <(exec udevadm monitor --udev --subsystem-match=graphics 2>/dev/null)
+    monitor_pid=$!
+    if ! scan_framebuffers; then
+        while (( SECONDS < deadline )); do
+            if read -r -t "$((deadline - SECONDS))" event <&"${events_fd}"; then
+                case "${event}" in
+                    *"(graphics)"*) scan_framebuffers && break ;;
+                esac
+            elif (( SECONDS < deadline )); then
+                # The monitor exited early, fall back to polling.
+                poll_framebuffers
+                break
+            fi
+        done
+    fi
+    kill "${monitor_pid}" 2>/dev/null || true
+    exec {events_fd}<&-
+else
+    poll_framebuffers
+fi
 
 if [ -z "${found_fb}" ]; then
     echo "Timeout waiting for SPI TFT framebuffer (display_type=${DISPLAY_TYPE})"
     echo "Available framebuffers:"
-    for fbpath in /sys/class/graphics/fb*; do
-        [ -e "${fbpath}/name" ] || continue
-        fbname="$(cat "${fbpath}/name" 2>/dev/null || true)"
-        devpath="$(readlink -f "${fbpath}/device" 2>/dev/null || true)"
-        echo "  ${fbpath}: name='${fbname}' device='${devpath}'"
-    done
+    python3 "${INVENTORY}" framebuffers
     exit 1
 fi
 
 echo "SPI TFT framebuffer ready on /dev/fb${found_fb}, mapping console..."
 con2fbmap 1 "${found_fb}"
-echo "Console mapped to framebuffer ${found_fb}"
+
+# Log how long the console took from the framebuffer device appearing to
+# being mapped, to track console time-to-first-pixel across boots.
+fb_us="$(date -r "/dev/fb${found_fb}" +%s%6N 2>/dev/null || true)"
+mapped_us="${EPOCHREALTIME/./}"
+read -r uptime _ < /proc/uptime
+if [ -n "${fb_us}" ]; then
+    echo "Console mapped to framebuffer ${found_fb} $(( (mapped_us - fb_us) / 1000 )) ms after it appeared (uptime ${uptime}s)"
+else
+    echo "Console mapped to framebuffer ${found_fb} (uptime ${uptime}s)"
+fi
 
 # Force a redraw of tty1. con2fbmap only updates the routing table;
 # without this, getty's earlier output stays on the old framebuffer and
@@ -124,10 +138,17 @@ fi
 # 30-cell grid using 6px glyphs in 8px slots, leaving the right ~25%
 # of the panel unpainted at the shell prompt.
 #
-# Re-running setupcon here, *after* con2fbmap, lands a second setfont
-# on the SPI fbcon while it is idle, which triggers the grid recompute
-# (30 cols * 8 px slot -> 40 cols * 6 px = full 240 px width).
-if command -v setupcon >/dev/null 2>&1; then
+# A second setfont on the SPI fbcon while it is idle triggers the grid
+# recompute (30 cols * 8 px slot -> 40 cols * 6 px = full 240 px width).
+# The installer caches the font sized for this panel, so a single setfont
+# is enough. Running setupcon twice instead, which regenerates its cached
+# console data each time, is only the fallback.
+font_start_us="${EPOCHREALTIME/./}"
+if [ -r "${CONSOLE_FONT}" ] && command -v setfont >/dev/null 2>&1 &&
+        setfont -C /dev/tty1 "${CONSOLE_FONT}" 2>/dev/null; then
+    font_ms=$(( (${EPOCHREALTIME/./} - font_start_us) / 1000 ))
+    echo "Loaded cached console font in ${font_ms} ms, about $(( SETUPCON_MS - font_ms )) ms less than re-running setupcon"
+elif command -v setupcon >/dev/null 2>&1; then
     echo "Re-applying console font to refresh fbcon character grid..."
     setupcon --force --save-only >/dev/null 2>&1 || true
     setupcon --force </dev/tty1 >/dev/tty1 2>&1 || true
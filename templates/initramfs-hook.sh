@@ -0,0 +1,28 @@
+#!/bin/sh
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+# initramfs-tools hook added by adafruit-pitft.py. It loads the SPI panel
+# driver and its command firmware from the initramfs, so the panel takes
+# over the console from the first kernel messages instead of probing after
+# the firmware framebuffer has already been painted (issue #341).
+
+PREREQ=""
+prereqs() {
+    echo "$PREREQ"
+}
+case "$1" in
+    prereqs)
+        prereqs
+        exit 0
+        ;;
+esac
+
+. /usr/share/initramfs-tools/hook-functions
+
+for module in {modules}; do
+    force_load "${module}"
+done
+copy_file firmware "/lib/firmware/{command_bin}.bin"
+exit 0
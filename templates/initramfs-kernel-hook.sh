@@ -0,0 +1,17 @@
+#!/bin/sh
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+# Kernel postinst hook added by adafruit-pitft.py. initramfs-tools builds
+# the initramfs for a new kernel, including the PiTFT panel driver, from its
+# own hook. This makes sure one exists even when the kernel package skipped
+# it, since without it the panel would fall back to probing late.
+
+version="$1"
+[ -n "${version}" ] || exit 0
+command -v update-initramfs >/dev/null 2>&1 || exit 0
+if [ ! -e "/boot/initrd.img-${version}" ]; then
+    update-initramfs -c -k "${version}"
+fi
+exit 0
@@ -0,0 +1,92 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the apt package planner in adafruit-pitft.py, with dpkg-query and apt-cache stubbed"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("adafruit_shell")
+pytest.importorskip("click")
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+DPKG_QUERY = """\
+python3-evdev ii
+python3-click un
+"""
+
+def apt_cache_policy(*packages):
+    return "".join(f"{package}:\n  Installed: (none)\n  Candidate: 1.0-1\n" for package in packages)
+
+@pytest.fixture(name="pitft")
+def fixture_pitft(tmp_path, monkeypatch):
+    """Import adafruit-pitft.py against an empty image, then run it as if on the system itself"""
+    (tmp_path / "root").mkdir()
+    (tmp_path / "boot").mkdir()
+    monkeypatch.setattr(sys, "argv", ["adafruit-pitft.py", "--root", str(tmp_path / "root"), "--boot-mount", str(tmp_path / "boot")])
+    monkeypatch.setenv("SUDO_USER", "pi")
+    spec = importlib.util.spec_from_file_location("adafruit_pitft", os.path.join(REPO, "adafruit-pitft.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.shell.root = None
+    module.shell.boot_mount = None
+    monkeypatch.setattr(module, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(module, "APT_UPDATE_STAMP", str(tmp_path / "cache" / "apt-update-stamp"))
+    return module
+
+class FakeApt:
+    """Answers dpkg-query and apt-cache, with candidates only once apt-get update has run"""
+
+    def __init__(self, lists=False):
+        self.lists = lists
+        self.commands = []
+
+    def run_command(self, cmd, suppress_message=False, return_output=False, run_as_user=None):
+        self.commands.append(cmd.split()[0] if cmd.startswith("apt-cache") else cmd)
+        if cmd.startswith("apt-cache policy"):
+            packages = cmd.split()[2:-1]
+            return apt_cache_policy(*[package for package in packages if package != "python3-numpy"]) if self.lists else ""
+        if "apt-get update" in cmd:
+            self.lists = True
+        return True
+
+    def run_host_command(self, cmd, suppress_message=False, return_output=False, run_as_user=None):
+        self.commands.append(cmd.split()[0])
+        return DPKG_QUERY
+
+def install(pitft, monkeypatch, apt, fresh):
+    monkeypatch.setattr(pitft.shell, "run_command", apt.run_command)
+    monkeypatch.setattr(pitft.shell, "run_host_command", apt.run_host_command)
+    monkeypatch.setattr(pitft, "apt_indexes_fresh", lambda: fresh)
+    return pitft.plan_packages(["python3-evdev", "python3-click", ("python3-numpy", "python3-numpy-dev")])
+
+def test_fresh_system_updates_before_looking_up_candidates(pitft, monkeypatch):
+    apt = FakeApt()
+    assert install(pitft, monkeypatch, apt, fresh=False) == ["python3-click", "python3-numpy-dev"]
+    assert apt.commands == ["dpkg-query", "sudo apt-get update", "apt-cache"]
+
+def test_fresh_indexes_are_not_updated(pitft, monkeypatch):
+    apt = FakeApt(lists=True)
+    assert install(pitft, monkeypatch, apt, fresh=True) == ["python3-click", "python3-numpy-dev"]
+    assert apt.commands == ["dpkg-query", "apt-cache"]
+
+def test_nothing_missing_skips_apt(pitft, monkeypatch):
+    apt = FakeApt()
+    monkeypatch.setattr(pitft.shell, "run_command", apt.run_command)
+    monkeypatch.setattr(pitft.shell, "run_host_command", apt.run_host_command)
+    assert pitft.plan_packages(["python3-evdev"]) == []
+    assert apt.commands == ["dpkg-query"]
+
+def test_missing_candidate_exits(pitft, monkeypatch):
+    apt = FakeApt()
+    monkeypatch.setattr(pitft.shell, "run_command", apt.run_command)
+    monkeypatch.setattr(pitft.shell, "run_host_command", apt.run_host_command)
+    monkeypatch.setattr(pitft, "apt_indexes_fresh", lambda: False)
+    with pytest.raises(SystemExit):
+        pitft.plan_packages(["python3-numpy"])
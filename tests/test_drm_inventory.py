@@ -0,0 +1,76 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for drm_inventory.py against a fixture sysfs tree"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("click")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import drm_inventory  # pylint: disable=wrong-import-position
+
+GPU = "devices/platform/axi/1002000000.v3d/gpu"
+SPI = "devices/platform/soc/fe204000.spi/spi_master/spi0/spi0.0"
+
+def add_device(root, device, driver):
+    os.makedirs(root / device)
+    os.makedirs(root / "bus/drivers" / driver, exist_ok=True)
+    os.symlink(root / "bus/drivers" / driver, root / device / "driver")
+
+def add_class_entry(root, class_name, name, device, attributes):
+    """Create /sys/class/<class_name>/<name> under device, like the kernel links it"""
+    path = root / device / class_name / name
+    os.makedirs(path)
+    os.symlink(root / device, path / "device")
+    for attribute, value in attributes.items():
+        (path / attribute).write_text(f"{value}\n", encoding="utf-8")
+    os.makedirs(root / "class" / class_name, exist_ok=True)
+    os.symlink(path, root / "class" / class_name / name)
+
+@pytest.fixture(name="sysfs")
+def fixture_sysfs(tmp_path):
+    """A Pi with an HDMI monitor and a panel-mipi-dbi-spi PiTFT"""
+    add_device(tmp_path, GPU, "vc4-drm")
+    add_device(tmp_path, SPI, "panel-mipi-dbi-spi")
+    add_class_entry(tmp_path, "drm", "card1", GPU, {})
+    add_class_entry(tmp_path, "drm", "card1-HDMI-A-1", GPU, {"status": "connected", "enabled": "enabled", "modes": "1920x1080\n1920x1080\n1280x720"})
+    add_class_entry(tmp_path, "drm", "card1-HDMI-A-2", GPU, {"status": "disconnected", "enabled": "disabled", "modes": ""})
+    add_class_entry(tmp_path, "drm", "card2", SPI, {})
+    add_class_entry(tmp_path, "drm", "card2-SPI-1", SPI, {"status": "connected", "enabled": "enabled", "modes": "240x320"})
+    add_class_entry(tmp_path, "graphics", "fb0", GPU, {"name": "vc4drmfb", "virtual_size": "1920,1080", "bits_per_pixel": "32"})
+    add_class_entry(tmp_path, "graphics", "fb1", SPI, {"name": "panel-mipi-dbid", "virtual_size": "240,320", "bits_per_pixel": "16"})
+    add_class_entry(tmp_path, "graphics", "fbcon", "devices/virtual/graphics", {})
+    return tmp_path
+
+def test_scan_cards_and_connectors(sysfs):
+    snapshot = drm_inventory.scan(str(sysfs))
+    assert snapshot["cards"]["card1"] == {"index": 1, "device": f"/{GPU}", "driver": "vc4-drm", "spi": None}
+    assert snapshot["cards"]["card2"]["spi"] == "spi0.0"
+    hdmi = snapshot["connectors"]["HDMI-A-1"]
+    assert hdmi["card"] == "card1"
+    assert hdmi["modes"] == ["1920x1080", "1280x720"]
+    assert snapshot["connectors"]["SPI-1"]["driver"] == "panel-mipi-dbi-spi"
+    assert [connector["name"] for connector in drm_inventory.connected_connectors(snapshot)] == ["HDMI-A-1", "SPI-1"]
+
+def test_scan_framebuffers(sysfs):
+    framebuffers = drm_inventory.scan(str(sysfs))["framebuffers"]
+    assert list(framebuffers) == [0, 1]
+    assert framebuffers[0]["card"] == "card1"
+    assert framebuffers[1]["card"] == "card2"
+    assert framebuffers[1]["virtual_size"] == "240,320"
+
+def test_find_spi_framebuffer(sysfs):
+    snapshot = drm_inventory.scan(str(sysfs))
+    assert drm_inventory.find_spi_framebuffer(snapshot)["number"] == 1
+    assert drm_inventory.find_spi_framebuffer(snapshot, "ili9341")["number"] == 1
+    del snapshot["framebuffers"][1]
+    assert drm_inventory.find_spi_framebuffer(snapshot) is None
+
+def test_scan_empty_tree(tmp_path):
+    assert drm_inventory.scan(str(tmp_path)) == {"cards": {}, "connectors": {}, "framebuffers": {}}
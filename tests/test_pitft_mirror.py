@@ -0,0 +1,83 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the dirty-region mirror in pitft_mirror.py, using file-backed framebuffers"""
+
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("click")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pitft_mirror  # pylint: disable=wrong-import-position
+
+# 4x2 source with one padding pixel per line, so the stride is 5
+SOURCE = np.array([
+    [0, 1, 2, 3, 99],
+    [4, 5, 6, 7, 99],
+])
+
+def gather(rotation, dest_size):
+    gather_map = pitft_mirror.build_gather_map((4, 2), 5, dest_size, rotation)
+    return SOURCE.ravel().take(gather_map)
+
+def test_gather_map_rotation_0():
+    assert (gather(0, (4, 2)) == SOURCE[:, :4]).all()
+
+def test_gather_map_rotation_90():
+    # Clockwise, so the bottom left source pixel ends up top left
+    assert gather(90, (2, 4)).tolist() == [[4, 0], [5, 1], [6, 2], [7, 3]]
+
+def test_gather_map_rotation_180():
+    assert gather(180, (4, 2)).tolist() == [[7, 6, 5, 4], [3, 2, 1, 0]]
+
+def test_gather_map_rotation_270():
+    assert gather(270, (2, 4)).tolist() == [[3, 7], [2, 6], [1, 5], [0, 4]]
+
+def test_gather_map_scales_down_with_nearest_neighbour():
+    assert gather(0, (2, 1)).tolist() == [[0, 2]]
+
+def test_to_rgb565():
+    pixels = np.array([0xFF0000, 0x00FF00, 0x0000FF, 0xFFFFFF, 0x000000], dtype=np.uint32)
+    converted = pitft_mirror.to_rgb565(pixels)
+    assert converted.dtype == np.uint16
+    assert converted.tolist() == [0xF800, 0x07E0, 0x001F, 0xFFFF, 0x0000]
+
+def test_dirty_rectangles():
+    previous = np.zeros((32, 48), dtype=np.uint16)
+    assert not pitft_mirror.dirty_rectangles(previous, previous.copy(), 16)
+
+    frame = previous.copy()
+    frame[5, 20] = 1
+    assert pitft_mirror.dirty_rectangles(previous, frame, 16) == [(16, 0, 16, 16)]
+
+    # Adjacent tiles in a row become one rectangle, the same span in the next tile row is merged
+    frame[5, 40] = frame[20, 20] = frame[20, 40] = 1
+    assert pitft_mirror.dirty_rectangles(previous, frame, 16) == [(16, 0, 32, 32)]
+
+def test_dirty_rectangles_are_clipped_to_the_frame():
+    previous = np.zeros((20, 20), dtype=np.uint16)
+    frame = previous.copy()
+    frame[19, 19] = 1
+    assert pitft_mirror.dirty_rectangles(previous, frame, 16) == [(16, 16, 4, 4)]
+
+def test_mirror_writes_only_changed_tiles(tmp_path):
+    source_path, dest_path = tmp_path / "source.raw", tmp_path / "dest.raw"
+    source_path.write_bytes(bytes(64 * 32 * 4))
+    dest_path.write_bytes(bytes(32 * 16 * 2))
+    source = pitft_mirror.Framebuffer(str(source_path), (64, 32), 32)
+    dest = pitft_mirror.Framebuffer(str(dest_path), (32, 16), 16)
+    mirror = pitft_mirror.Mirror(source, dest, tile=8, cache_dir=None)
+
+    assert mirror.update() == 32 * 16
+    assert mirror.update() == 0
+    source.pixels[0, 0] = 0xFFFFFF
+    assert mirror.update() == 8 * 8
+    assert dest.pixels[0, 0] == 0xFFFF
+    source.close()
+    dest.close()
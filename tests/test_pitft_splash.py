@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the boot splash in pitft_splash.py, shown on a file-backed framebuffer"""
+
+import os
+import struct
+import sys
+
+import pytest
+
+pytest.importorskip("click")
+Image = pytest.importorskip("PIL.Image")
+from click.testing import CliRunner  # pylint: disable=wrong-import-position
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pitft_splash  # pylint: disable=wrong-import-position
+
+def pixel(data, width, x, y):
+    return struct.unpack_from("<H", data, (y * width + x) * 2)[0]
+
+def test_convert_image_is_little_endian_rgb565(tmp_path):
+    Image.new("RGB", (4, 2), (255, 0, 0)).save(tmp_path / "red.png")
+    data = pitft_splash.convert_image(str(tmp_path / "red.png"), (4, 2))
+    assert data == struct.pack("<H", 0xF800) * 8
+
+def test_convert_image_keeps_the_aspect_ratio(tmp_path):
+    # A wide image on a tall panel gets black borders above and below
+    Image.new("RGB", (20, 10), (255, 255, 255)).save(tmp_path / "white.png")
+    data = pitft_splash.convert_image(str(tmp_path / "white.png"), (10, 20))
+    assert len(data) == 10 * 20 * 2
+    assert pixel(data, 10, 5, 0) == 0
+    assert pixel(data, 10, 5, 10) == 0xFFFF
+    assert pixel(data, 10, 5, 19) == 0
+
+def test_convert_and_show_on_a_framebuffer_file(tmp_path):
+    Image.new("RGB", (8, 4), (0, 0, 255)).save(tmp_path / "blue.png")
+    splash = str(tmp_path / "splash.rgb565")
+    runner = CliRunner()
+    result = runner.invoke(pitft_splash.main, [splash, "--size", "8x4", "--convert", str(tmp_path / "blue.png")])
+    assert result.exit_code == 0, result.output
+
+    # Lines of 24 bytes with 8 bytes of padding each, which the splash must leave alone
+    (tmp_path / "fb.raw").write_bytes(b"\xaa" * 24 * 4)
+    result = runner.invoke(pitft_splash.main, [splash, "--size", "8x4", "--framebuffer", str(tmp_path / "fb.raw"), "--stride", "24"])
+    assert result.exit_code == 0, result.output
+    framebuffer = (tmp_path / "fb.raw").read_bytes()
+    for row in range(4):
+        assert framebuffer[row * 24:row * 24 + 16] == struct.pack("<H", 0x001F) * 8
+        assert framebuffer[row * 24 + 16:(row + 1) * 24] == b"\xaa" * 8
+
+def test_show_rejects_a_splash_of_the_wrong_size(tmp_path):
+    (tmp_path / "splash.rgb565").write_bytes(bytes(8 * 4 * 2))
+    (tmp_path / "fb.raw").write_bytes(bytes(16 * 16 * 2))
+    result = CliRunner().invoke(pitft_splash.main, [str(tmp_path / "splash.rgb565"), "--size", "16x16", "--framebuffer", str(tmp_path / "fb.raw")])
+    assert result.exit_code != 0
+    assert "is not a 16x16 RGB565 buffer" in result.output
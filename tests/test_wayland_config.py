@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""Tests for the kanshi and wayfire.ini parsers in wayland_config.py"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wayland_config  # pylint: disable=wrong-import-position
+
+# ~/.config/kanshi/config as written by raspi-config and the Screen Configuration tool
+KANSHI_CONFIG = """\
+profile {
+\toutput HDMI-A-1 enable mode 1920x1080@60.000 position 0,0 transform normal
+\toutput SPI-1 enable mode 320x240 position 1920,0 transform normal scale 0.5
+}
+
+# Docked at the desk
+profile docked {
+    output HDMI-A-1 enable mode 2560x1440@59.951 position 0,0 transform normal  # main monitor
+    output HDMI-A-2 disable
+}
+"""
+
+# ~/.config/wayfire.ini from Raspberry Pi OS Bookworm
+WAYFIRE_CONFIG = """\
+[core]
+plugins = \\
+        autostart \\
+        hide-cursor \\
+        place \\
+        switcher
+
+[output:HDMI-A-1]
+mode = 1920x1080@60000
+position = 0,0
+transform = normal
+
+[autostart]
+panel = wfrespawn wf-panel-pi
+"""
+
+def test_kanshi_round_trip_is_byte_identical():
+    config = wayland_config.KanshiConfig(KANSHI_CONFIG)
+    assert [profile.name for profile in config.profiles] == [None, "docked"]
+    assert config.serialize() == KANSHI_CONFIG
+
+def test_kanshi_round_trip_without_trailing_newline():
+    text = KANSHI_CONFIG.rstrip("\n")
+    assert wayland_config.KanshiConfig(text).serialize() == text
+
+def test_kanshi_output_parsing():
+    profile = wayland_config.KanshiConfig(KANSHI_CONFIG).profiles[1]
+    output = profile.find_output("HDMI-A-1")
+    assert output.options == ["enable", "mode", "2560x1440@59.951", "position", "0,0", "transform", "normal"]
+    assert output.comment == "# main monitor"
+    assert profile.find_output("SPI-1") is None
+
+def test_kanshi_set_scale_only_touches_that_output():
+    config = wayland_config.KanshiConfig(KANSHI_CONFIG)
+    config.profiles[0].find_output("SPI-1").set("scale", "0.75")
+    expected = KANSHI_CONFIG.replace("transform normal scale 0.5", "transform normal scale 0.75")
+    assert config.serialize() == expected
+
+def test_kanshi_add_output_keeps_indent_and_comment():
+    config = wayland_config.KanshiConfig(KANSHI_CONFIG)
+    config.profiles[1].add_output("SPI-1", ["enable", "scale", "0.5"])
+    lines = config.serialize().splitlines()
+    assert lines[-2] == "    output SPI-1 enable scale 0.5"
+    assert "    output HDMI-A-1 enable mode 2560x1440@59.951 position 0,0 transform normal  # main monitor" in lines
+    # The first profile is untouched
+    assert config.serialize().startswith(KANSHI_CONFIG.split("\n\n", 1)[0])
+
+def test_kanshi_quoted_output_name():
+    config = wayland_config.KanshiConfig('profile {\n\toutput "Some Monitor 1234" enable\n}\n')
+    assert config.profiles[0].find_output("Some Monitor 1234") is not None
+
+def test_kanshi_single_line_profiles():
+    text = "profile docked { output HDMI-A-1 enable }\nprofile {}\n" + KANSHI_CONFIG
+    config = wayland_config.KanshiConfig(text)
+    assert [profile.name for profile in config.profiles] == ["docked", None, None, "docked"]
+    assert config.profiles[0].find_output("HDMI-A-1").options == ["enable"]
+    assert config.profiles[1].outputs() == []
+    assert config.serialize() == text
+
+def test_kanshi_single_line_profile_is_expanded_when_edited():
+    config = wayland_config.KanshiConfig("profile docked { output HDMI-A-1 enable }  # desk\n")
+    config.profiles[0].add_output("SPI-1", ["enable", "scale", "0.5"])
+    assert config.serialize() == "profile docked {\n\toutput HDMI-A-1 enable\n\toutput SPI-1 enable scale 0.5\n}\n"
+
+def test_kanshi_add_profile_to_empty_and_unterminated_files():
+    config = wayland_config.KanshiConfig()
+    config.add_profile().add_output("SPI-1", ["enable"])
+    assert config.serialize() == "profile {\n\toutput SPI-1 enable\n}\n"
+
+    config = wayland_config.KanshiConfig("# no profiles yet")
+    config.add_profile("pitft")
+    assert config.serialize() == "# no profiles yet\nprofile pitft {\n}\n"
+
+def test_wayfire_round_trip_is_byte_identical():
+    config = wayland_config.WayfireConfig(WAYFIRE_CONFIG)
+    config.remove_helper_blocks()
+    assert config.serialize() == WAYFIRE_CONFIG
+
+def test_wayfire_set_existing_output():
+    config = wayland_config.WayfireConfig(WAYFIRE_CONFIG)
+    config.set_output("HDMI-A-1", {"scale": 0.5, "transform": "90"}, "today")
+    expected = WAYFIRE_CONFIG.replace("[output:HDMI-A-1]\n", "[output:HDMI-A-1]\nscale = 0.5\n").replace("transform = normal", "transform = 90")
+    assert config.serialize() == expected
+
+def test_wayfire_add_output_is_replaced_on_the_next_run():
+    config = wayland_config.WayfireConfig(WAYFIRE_CONFIG)
+    config.set_output("SPI-1", {"scale": 0.5}, "Mon Jan  1")
+    added = config.serialize()
+    assert added == WAYFIRE_CONFIG + (
+        "\n# --- added by adafruit-pitft-helper Mon Jan  1 ---\n"
+        "[output:SPI-1]\nscale = 0.5\n"
+        "# --- end adafruit-pitft-helper Mon Jan  1 ---\n"
+    )
+
+    config = wayland_config.WayfireConfig(added)
+    config.remove_helper_blocks()
+    assert config.serialize() == WAYFIRE_CONFIG
+    config.set_output("SPI-1", {"scale": 0.25}, "Tue Jan  2")
+    assert config.serialize().count("[output:SPI-1]") == 1
+    assert "scale = 0.25\n" in config.serialize()
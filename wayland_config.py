@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: 2026 Adafruit Industries
+#
+# SPDX-License-Identifier: MIT
+
+"""
+Adafruit Wayland Output Configuration
+
+Parsers and serializers for kanshi profiles (used with labwc) and the
+output sections of wayfire.ini. Anything that is not edited is serialized
+exactly as it was read, so unrelated profiles and sections stay
+byte-identical. Writing the result is left to the caller.
+
+See https://man.archlinux.org/man/kanshi.5.en for the kanshi format.
+"""
+
+import os
+import re
+import shlex
+
+PROFILE_START = re.compile(r"^\s*profile(?:\s+(?P<name>[^\s{]+))?\s*\{\s*(?:#.*)?$")
+PROFILE_INLINE = re.compile(r"^\s*profile(?:\s+(?P<name>[^\s{]+))?\s*\{(?P<body>[^}]*)\}\s*(?:#.*)?$")
+BLOCK_END = re.compile(r"^\s*\}\s*(?:#.*)?$")
+OUTPUT_LINE = re.compile(r"^(?P<indent>\s*)output\s")
+INI_SECTION = re.compile(r"^\s*\[(?P<name>[^\]]+)\]")
+INI_KEY = re.compile(r"^\s*(?P<key>[^=#;\s]+)\s*=")
+HELPER_BLOCK = re.compile(r"\n# --- added by adafruit-pitft-helper.*?\n# --- end adafruit-pitft-helper.*?\n", re.DOTALL)
+
+def split_comment(line):
+    """Split a line into its content and a trailing # comment"""
+    match = re.search(r"(^|\s)#", line)
+    if match is None:
+        return line, ""
+    return line[:match.start()], line[match.start():].strip()
+
+class KanshiOutput:
+    """An output directive inside a kanshi profile"""
+
+    def __init__(self, line=None, name=None, options=None, indent="\t"):
+        self.raw = line
+        self.modified = line is None
+        if line is None:
+            self.indent = indent
+            self.comment = ""
+            self.name = name
+            self.options = list(options or [])
+            return
+        self.indent = OUTPUT_LINE.match(line).group("indent")
+        content, self.comment = split_comment(line.rstrip("\n"))
+        tokens = shlex.split(content, posix=False)
+        self.name = tokens[1]
+        self.options = tokens[2:]
+
+    def matches(self, name):
+        return self.name.strip('"') == name
+
+    def set(self, key, value):
+        """Set an option such as scale or transform, replacing any existing value"""
+        if key in self.options and self.options.index(key) + 1 < len(self.options):
+            self.options[self.options.index(key) + 1] = value
+        else:
+            self.options += [key, value]
+        self.modified = True
+
+    def serialize(self):
+        if not self.modified:
+            return self.raw
+        line = self.indent + " ".join(["output", self.name] + self.options)
+        if self.comment:
+            line += " " + self.comment
+        return line + "\n"
+
+class KanshiProfile:
+    """A profile block, keeping every line that is not an output directive as is"""
+
+    def __init__(self, lines=None, name=None):
+        self.modified = lines is None
+        if lines is None:
+            lines = ["profile {}{{\n".format(f"{name} " if name else ""), "}\n"]
+        self.raw = "".join(lines)
+        self.name = PROFILE_START.match(lines[0]).group("name")
+        self.header = lines[0]
+        self.footer = lines[-1]
+        self.body = [KanshiOutput(line) if OUTPUT_LINE.match(line) else line for line in lines[1:-1]]
+
+    @classmethod
+    def inline(cls, line):
+        """Parse a profile written on one line, e.g. profile docked { output HDMI-A-1 enable }
+
+        It is serialized as is until it is edited, and then as a multi-line block.
+        """
+        match = PROFILE_INLINE.match(line)
+        name = match.group("name")
+        body = match.group("body").strip()
+        profile = cls(["profile {}{{\n".format(f"{name} " if name else "")] + ([f"\t{body}\n"] if body else []) + ["}\n"])
+        profile.raw = line
+        return profile
+
+    def outputs(self):
+        return [item for item in self.body if isinstance(item, KanshiOutput)]
+
+    def find_output(self, name):
+        return next((output for output in self.outputs() if output.matches(name)), None)
+
+    def add_output(self, name, options):
+        """Add an output directive, indented like the existing ones"""
+        outputs = self.outputs()
+        indent = outputs[-1].indent if outputs else "\t"
+        output = KanshiOutput(name=name, options=options, indent=indent)
+        self.body.append(output)
+        self.modified = True
+        return output
+
+    def serialize(self):
+        if not self.modified and not any(isinstance(item, KanshiOutput) and item.modified for item in self.body):
+            return self.raw
+        body = "".join(item.serialize() if isinstance(item, KanshiOutput) else item for item in self.body)
+        return self.header + body + self.footer
+
+class KanshiConfig:
+    """A kanshi config file as a list of raw text and profiles"""
+
+    def __init__(self, text=""):
+        self.original = text
+        self.segments = []
+        lines = text.splitlines(keepends=True)
+        index = 0
+        while index < len(lines):
+            if PROFILE_INLINE.match(lines[index]):
+                self.segments.append(KanshiProfile.inline(lines[index]))
+                index += 1
+                continue
+            if PROFILE_START.match(lines[index]):
+                end = next((i for i in range(index + 1, len(lines)) if BLOCK_END.match(lines[i])), None)
+                if end is not None:
+                    self.segments.append(KanshiProfile(lines[index:end + 1]))
+                    index = end + 1
+                    continue
+            self.segments.append(lines[index])
+            index += 1
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as file:
+            return cls(file.read())
+
+    @property
+    def profiles(self):
+        return [segment for segment in self.segments if isinstance(segment, KanshiProfile)]
+
+    def add_profile(self, name=None):
+        profile = KanshiProfile(name=name)
+        if self.segments:
+            last = self.segments[-1]
+            text = last.serialize() if isinstance(last, KanshiProfile) else last
+            if not text.endswith("\n"):
+                self.segments.append("\n")
+        self.segments.append(profile)
+        return profile
+
+    def serialize(self):
+        return "".join(segment.serialize() if isinstance(segment, KanshiProfile) else segment for segment in self.segments)
+
+class WayfireConfig:
+    """wayfire.ini with just enough structure to edit [output:NAME] sections"""
+
+    def __init__(self, text=""):
+        self.original = text
+        self.lines = text.splitlines(keepends=True)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as file:
+            return cls(file.read())
+
+    def remove_helper_blocks(self):
+        """Remove the sections previously added by adafruit-pitft-helper"""
+        self.lines = HELPER_BLOCK.sub("", "".join(self.lines)).splitlines(keepends=True)
+
+    def section_range(self, name):
+        """Return the (start, end) line indexes of a section's body, or None"""
+        start = None
+        for index, line in enumerate(self.lines):
+            match = INI_SECTION.match(line)
+            if match and start is not None:
+                return start, index
+            if match and match.group("name").strip() == name:
+                start = index + 1
+        return (start, len(self.lines)) if start is not None else None
+
+    def set_output(self, output, options, date):
+        """Set options in the [output:NAME] section, adding a marked section if there is none"""
+        section = f"output:{output}"
+        body = self.section_range(section)
+        if body is None:
+            if self.lines and not self.lines[-1].endswith("\n"):
+                self.lines[-1] += "\n"
+            self.lines.append("\n")
+            self.lines.append(f"# --- added by adafruit-pitft-helper {date} ---\n")
+            self.lines.append(f"[{section}]\n")
+            self.lines.extend(f"{key} = {value}\n" for key, value in options.items())
+            self.lines.append(f"# --- end adafruit-pitft-helper {date} ---\n")
+            return
+        start, end = body
+        for key, value in options.items():
+            index = next((i for i in range(start, end) if (match := INI_KEY.match(self.lines[i])) and match.group("key") == key), None)
+            if index is None:
+                self.lines.insert(start, f"{key} = {value}\n")
+                end += 1
+            else:
+                self.lines[index] = f"{key} = {value}\n"
+
+    def serialize(self):
+        return "".join(self.lines)